@@ -0,0 +1,118 @@
+"""Generate a synthetic Telegram data lake for benchmarks.
+
+The layout matches what scripts/scrape_telegram.py writes:
+``<root>/<channel>/<YYYY-MM-DD>.json`` holding one JSON message per line,
+and photos under ``<root>/<channel>/images/<message_id>.jpg``.
+"""
+import json
+import random
+import shutil
+import argparse
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# Words messages are built from; the Amharic ones exercise the 'simple'
+# text search configuration
+VOCABULARY = (
+    "paracetamol vitamin cream lotion serum tablets syrup capsules bottle delivery price discount "
+    "available order today original imported pharmacy cosmetics skincare sunscreen shampoo "
+    "መድሃኒት ዋጋ አዲስ ቅናሽ ይደውሉ"
+).split()
+
+
+def placeholder_image(rng, width, height):
+    """Return a BGR image of a few coloured rectangles on a plain background."""
+    image = np.full((height, width, 3), [rng.randrange(256) for _ in range(3)], dtype=np.uint8)
+    for _ in range(rng.randint(1, 4)):
+        x1, y1 = rng.randrange(width // 2), rng.randrange(height // 2)
+        x2, y2 = x1 + rng.randrange(16, width // 2), y1 + rng.randrange(16, height // 2)
+        cv2.rectangle(image, (x1, y1), (x2, y2), [rng.randrange(256) for _ in range(3)], -1)
+    return image
+
+
+def generate_lake(root, channels=3, days=30, messages_per_day=200, photo_ratio=0.3,
+                  duplicate_ratio=0.2, image_size=(640, 480), start=date(2024, 1, 1), seed=0):
+    """Write a synthetic data lake under ``root`` and return a summary of it.
+
+    ``duplicate_ratio`` of the photos are byte-for-byte copies of earlier
+    ones, as reposted product photos are in the real channels, so the
+    enrichment cache is exercised too. The same arguments always produce
+    the same lake.
+    """
+    rng = random.Random(seed)
+    root = Path(root)
+    summary = {"channels": channels, "days": days, "messages": 0, "photos": 0, "bytes": 0}
+
+    for channel_index in range(channels):
+        channel = f"bench_channel_{channel_index}"
+        images_path = root / channel / "images"
+        images_path.mkdir(parents=True, exist_ok=True)
+        photos = []
+        message_id = 0
+
+        for day_offset in range(days):
+            day = start + timedelta(days=day_offset)
+            midnight = datetime.combine(day, time.min, tzinfo=timezone.utc)
+            seconds = sorted(rng.randrange(86400) for _ in range(messages_per_day))
+            lines = []
+            for second in seconds:
+                message_id += 1
+                message = {
+                    "message_id": message_id,
+                    "date": (midnight + timedelta(seconds=second)).isoformat(),
+                    "text": " ".join(rng.choices(VOCABULARY, k=rng.randint(3, 40))),
+                    "has_media": False,
+                    "media_type": None,
+                    "media_path": None,
+                }
+                if rng.random() < photo_ratio:
+                    media_path = images_path / f"{message_id}.jpg"
+                    if photos and rng.random() < duplicate_ratio:
+                        shutil.copyfile(rng.choice(photos), media_path)
+                    else:
+                        cv2.imwrite(str(media_path), placeholder_image(rng, *image_size))
+                    photos.append(media_path)
+                    summary["photos"] += 1
+                    summary["bytes"] += media_path.stat().st_size
+                    message.update(has_media=True, media_type="photo", media_path=str(media_path))
+                lines.append(json.dumps(message, ensure_ascii=False))
+
+            day_file = root / channel / f"{day.isoformat()}.json"
+            day_file.write_text("\n".join(lines) + "\n", encoding="utf-8")
+            summary["messages"] += len(lines)
+            summary["bytes"] += day_file.stat().st_size
+
+    return summary
+
+
+def add_lake_arguments(parser):
+    """Add the lake size options shared by this script and the benchmark runner."""
+    parser.add_argument("--channels", type=int, default=3)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--messages-per-day", type=int, default=200)
+    parser.add_argument("--photo-ratio", type=float, default=0.3)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.2,
+                        help="Share of photos that repeat an earlier photo byte for byte")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def lake_options(args):
+    return {
+        "channels": args.channels,
+        "days": args.days,
+        "messages_per_day": args.messages_per_day,
+        "photo_ratio": args.photo_ratio,
+        "duplicate_ratio": args.duplicate_ratio,
+        "seed": args.seed,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Telegram data lake.")
+    parser.add_argument("root", help="Directory to write the lake to")
+    add_lake_arguments(parser)
+    args = parser.parse_args()
+    print(json.dumps(generate_lake(args.root, **lake_options(args)), indent=2))
@@ -0,0 +1,60 @@
+"""Throwaway PostgreSQL server in Docker for benchmarks."""
+import os
+import time
+import socket
+import subprocess
+from contextlib import contextmanager
+
+import psycopg2
+
+POSTGRES_IMAGE = "postgres:15"  # same as docker-compose.yml
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def throwaway_postgres(image=POSTGRES_IMAGE, timeout=60):
+    """Start a disposable PostgreSQL container and yield its connection parameters.
+
+    The container is removed on exit, along with everything written to it.
+    """
+    port = _free_port()
+    params = {"dbname": "bench", "user": "bench", "password": "bench", "host": "127.0.0.1", "port": port}
+    container = subprocess.run(
+        ["docker", "run", "-d", "--rm",
+         "-e", f"POSTGRES_DB={params['dbname']}",
+         "-e", f"POSTGRES_USER={params['user']}",
+         "-e", f"POSTGRES_PASSWORD={params['password']}",
+         "-p", f"127.0.0.1:{port}:5432",
+         image],
+        check=True, capture_output=True, text=True,
+    ).stdout.strip()
+
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                psycopg2.connect(**params).close()
+                break
+            except psycopg2.OperationalError:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"PostgreSQL in container {container[:12]} did not start in {timeout}s")
+                time.sleep(0.5)
+        yield params
+    finally:
+        subprocess.run(["docker", "stop", container], capture_output=True)
+
+
+def export_connection_env(params):
+    """Point the pipeline scripts, the API and dbt at ``params`` through the environment."""
+    os.environ.update({
+        "POSTGRES_DB": params["dbname"],
+        "POSTGRES_USER": params["user"],
+        "POSTGRES_PASSWORD": params["password"],
+        "POSTGRES_HOST": params["host"],
+        "POSTGRES_PORT": str(params["port"]),
+    })
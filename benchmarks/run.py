@@ -0,0 +1,259 @@
+"""Benchmark the pipeline end to end on a synthetic data lake.
+
+Generates a lake, starts a throwaway PostgreSQL container (or uses the
+POSTGRES_* environment with --external-db), then times the loader, YOLO
+enrichment with a stub model, the dbt build and the API under concurrent
+load. Results are written as JSON and can be compared with an earlier run:
+
+    python -m benchmarks.run --output benchmarks/results/today.json \
+        --baseline benchmarks/results/last_week.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import subprocess
+import statistics
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks.generate_lake import add_lake_arguments, generate_lake, lake_options
+from benchmarks.postgres import export_connection_env, throwaway_postgres
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+DBT_PROJECT_DIR = PROJECT_ROOT / "dbt_project"
+
+STAGES = ("load", "enrich", "dbt", "api")
+
+# Metrics ending in these suffixes are better when higher; all others
+# (seconds, milliseconds) are better when lower
+HIGHER_IS_BETTER = ("_per_second", "hit_rate")
+
+
+def bench_load(args):
+    from scripts import load_raw_to_postgres
+
+    started = time.perf_counter()
+    summaries = load_raw_to_postgres.load_json_to_postgres(force=True, workers=args.workers)
+    elapsed = time.perf_counter() - started
+    rows = sum(summary["rows"] for summary in summaries)
+
+    # Second pass: every file matches the manifest and is skipped
+    started = time.perf_counter()
+    load_raw_to_postgres.load_json_to_postgres(workers=args.workers)
+    unchanged = time.perf_counter() - started
+
+    return {
+        "load.rows": rows,
+        "load.seconds": elapsed,
+        "load.rows_per_second": rows / elapsed if elapsed else 0.0,
+        "load.unchanged_seconds": unchanged,
+    }
+
+
+def bench_enrich(args):
+    from benchmarks import stub_model
+
+    stub_model.install(args.stub_latency_ms)
+    from scripts import enrich_with_yolo
+
+    summary = enrich_with_yolo.enrich_images_with_yolo()
+    looked_up = summary["hits"] + summary["phash_hits"] + summary["misses"]
+    return {
+        "enrich.images": summary["images"],
+        "enrich.seconds": summary["elapsed_seconds"],
+        "enrich.images_per_second": summary["images_per_second"],
+        "enrich.cache_hit_rate": (summary["hits"] + summary["phash_hits"]) / looked_up if looked_up else 0.0,
+    }
+
+
+def _dbt_run(*extra):
+    from dbt.cli.main import dbtRunner
+
+    started = time.perf_counter()
+    result = dbtRunner().invoke([
+        "run", "--project-dir", str(DBT_PROJECT_DIR), "--profiles-dir", str(DBT_PROJECT_DIR), *extra])
+    if not result.success:
+        raise RuntimeError(f"dbt run failed: {result.exception}")
+    return time.perf_counter() - started
+
+
+def bench_dbt(args):
+    return {
+        "dbt.full_refresh_seconds": _dbt_run("--full-refresh"),
+        # Nothing changed since the full refresh, so incremental models add nothing
+        "dbt.incremental_seconds": _dbt_run(),
+    }
+
+
+def _percentile(sorted_values, percent):
+    index = min(len(sorted_values) - 1, round(percent / 100 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+async def _bench_api(args, endpoints):
+    import httpx
+    from main import app
+    from scripts.database import async_engine
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, url in endpoints:
+            # Warm the connection pool and prepared statements
+            (await client.get(url)).raise_for_status()
+
+            latencies = []
+            remaining = iter(range(args.api_requests))
+
+            async def worker():
+                for _ in remaining:
+                    started = time.perf_counter()
+                    response = await client.get(url)
+                    latencies.append(time.perf_counter() - started)
+                    response.raise_for_status()
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.api_concurrency)))
+            elapsed = time.perf_counter() - started
+
+            latencies.sort()
+            results[f"api.{name}.p50_ms"] = _percentile(latencies, 50) * 1000
+            results[f"api.{name}.p99_ms"] = _percentile(latencies, 99) * 1000
+            results[f"api.{name}.mean_ms"] = statistics.fmean(latencies) * 1000
+            results[f"api.{name}.requests_per_second"] = len(latencies) / elapsed
+    await async_engine.dispose()
+    return results
+
+
+def bench_api(args):
+    if not args.api_cache:
+        # Evict every response as soon as it is stored, so requests hit the database
+        os.environ["API_CACHE_MAX_ENTRIES"] = "0"
+    endpoints = [
+        ("top_products", "/api/reports/top-products?limit=10"),
+        ("top_products_filtered", "/api/reports/top-products?limit=10&min_confidence=0.6"),
+        ("search", "/api/search/messages?query=vitamin&limit=50"),
+        ("channel_activity", "/api/channels/bench_channel_0/activity"),
+        ("channels", "/channels/"),
+        ("messages_page", "/api/messages?channel=bench_channel_0&limit=100"),
+        ("detections_page", "/api/detections?limit=100"),
+    ]
+    return asyncio.run(_bench_api(args, endpoints))
+
+
+BENCHMARKS = {"load": bench_load, "enrich": bench_enrich, "dbt": bench_dbt, "api": bench_api}
+
+
+def compare(results, baseline, tolerance):
+    """Return (metric, baseline, current, change) for metrics more than ``tolerance`` worse."""
+    regressions = []
+    for metric, current in results.items():
+        previous = baseline.get(metric)
+        if not previous or metric.endswith((".rows", ".images")):
+            continue
+        change = (current - previous) / previous
+        worse = -change if metric.endswith(HIGHER_IS_BETTER) else change
+        if worse > tolerance:
+            regressions.append((metric, previous, current, change))
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    workdir = Path(tempfile.mkdtemp(prefix="telegram-bench-"))
+    lake = workdir / "lake"
+    started = time.perf_counter()
+    lake_summary = generate_lake(lake, **lake_options(args))
+    print(f"Generated {lake_summary['messages']} messages and {lake_summary['photos']} photos "
+          f"in {time.perf_counter() - started:.1f}s under {lake}")
+
+    # The scripts read their settings at import time; keep their logs with
+    # the rest of the run's files
+    os.environ["DATA_LAKE_PATH"] = str(lake)
+    os.environ["LOG_DIR"] = str(workdir / "logs")
+    os.chdir(workdir)
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+    results = {}
+    for stage in args.stages:
+        print(f"Running {stage} benchmark")
+        results.update(BENCHMARKS[stage](args))
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "lake": lake_summary,
+            "options": {key: value for key, value in vars(args).items()
+                        if key not in ("output", "baseline")},
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on a synthetic data lake.")
+    add_lake_arguments(parser)
+    parser.add_argument("--stages", type=lambda value: value.split(","), default=list(STAGES),
+                        help=f"Comma-separated stages to run, in order (default: {','.join(STAGES)})")
+    parser.add_argument("--workers", type=int, default=4, help="Loader worker processes")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0,
+                        help="Simulated inference time per image")
+    parser.add_argument("--api-concurrency", type=int, default=16)
+    parser.add_argument("--api-requests", type=int, default=500, help="Requests per endpoint")
+    parser.add_argument("--api-cache", action="store_true",
+                        help="Keep the API response cache enabled (measures cache hits)")
+    parser.add_argument("--external-db", action="store_true",
+                        help="Use the database in the POSTGRES_* environment instead of a container")
+    parser.add_argument("--output", default=None,
+                        help="Results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Relative slowdown reported as a regression (default: %(default)s)")
+    args = parser.parse_args()
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    output = Path(args.output or PROJECT_ROOT / "benchmarks" / "results"
+                  / f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json").resolve()
+    baseline = Path(args.baseline).resolve() if args.baseline else None
+
+    if args.external_db:
+        report = run(args)
+    else:
+        with throwaway_postgres() as params:
+            export_connection_env(params)
+            report = run(args)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2) + "\n")
+    for metric, value in report["results"].items():
+        print(f"{metric:<45} {value:>14.3f}")
+    print(f"Results written to {output}")
+
+    if baseline:
+        regressions = compare(report["results"], json.loads(baseline.read_text())["results"], args.tolerance)
+        for metric, previous, current, change in regressions:
+            print(f"REGRESSION {metric}: {previous:.3f} -> {current:.3f} ({change:+.1%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Stand-in for the YOLO model so enrichment can be benchmarked without weights or a GPU."""
+import time
+
+LABELS = {0: "bottle", 1: "cosmetic", 2: "pill"}
+
+
+class StubBox:
+    def __init__(self, cls, conf, xyxy):
+        self.cls = cls
+        self.conf = conf
+        self.xyxy = [xyxy]
+
+
+class StubResult:
+    names = LABELS
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class StubYOLO:
+    """Callable like an ``ultralytics.YOLO`` model: one deterministic box per image.
+
+    ``latency_ms`` per image is slept to approximate a real model; with 0
+    the benchmark measures everything around inference.
+    """
+
+    latency_ms = 0.0
+
+    def __init__(self, weights=None):
+        self.weights = weights
+
+    def __call__(self, images, verbose=False):
+        if self.latency_ms:
+            time.sleep(self.latency_ms * len(images) / 1000)
+        results = []
+        for image in images:
+            height, width = image.shape[:2]
+            label = int(image[0, 0].sum()) % len(LABELS)
+            box = StubBox(label, 0.5 + label / 10, [width * 0.25, height * 0.25, width * 0.75, height * 0.75])
+            results.append(StubResult([box]))
+        return results
+
+
+def install(latency_ms=0.0):
+    """Register a stub in place of the configured YOLO weights; ultralytics is never imported."""
+    from scripts.model_registry import MODEL_NAME, register_model
+
+    StubYOLO.latency_ms = latency_ms
+    register_model(MODEL_NAME, StubYOLO(MODEL_NAME))
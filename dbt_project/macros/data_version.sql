@@ -0,0 +1,17 @@
+{% macro create_data_version_table() %}
+    CREATE TABLE IF NOT EXISTS public.pipeline_data_version (
+        id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+        version BIGINT NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+{% endmacro %}
+
+{% macro bump_data_version() %}
+    -- The API keys its response cache and ETags on this version, so bumping
+    -- it after a run invalidates every cached response
+    INSERT INTO public.pipeline_data_version (id, version, updated_at)
+    VALUES (1, 1, CURRENT_TIMESTAMP)
+    ON CONFLICT (id) DO UPDATE SET
+        version = public.pipeline_data_version.version + 1,
+        updated_at = EXCLUDED.updated_at
+{% endmacro %}
@@ -0,0 +1,10 @@
+{% macro channel_key(channel_name) %}
+    {#- Stable 64-bit key from the channel name: the same channel gets the same
+        id in every model and on every rebuild, without a lookup join -#}
+    ('x' || SUBSTR(MD5({{ channel_name }}), 1, 16))::BIT(64)::BIGINT
+{%- endmacro %}
+
+{% macro date_key(date_expression) %}
+    {#- YYYYMMDD integer key into dim_dates -#}
+    TO_CHAR(({{ date_expression }})::DATE, 'YYYYMMDD')::INTEGER
+{%- endmacro %}
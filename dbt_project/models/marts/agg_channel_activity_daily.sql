@@ -0,0 +1,37 @@
+{{ config(
+    materialized='incremental',
+    schema='marts',
+    unique_key='activity_date',
+    incremental_strategy='delete+insert',
+    indexes=[
+        {'columns': ['channel_name', 'activity_date'], 'unique': True},
+    ]
+) }}
+
+-- Messages per channel per day. Incremental runs rebuild every day that
+-- has messages loaded since the last run, however old (backfills included),
+-- for all channels at once.
+
+{% if is_incremental() %}
+WITH changed_days AS (
+    SELECT DISTINCT message_date::DATE AS activity_date
+    FROM {{ ref('stg_telegram_messages') }}
+    WHERE loaded_at > (SELECT COALESCE(MAX(dbt_updated_at), '-infinity') FROM {{ this }})
+        - INTERVAL '{{ var("load_lookback_minutes") }} minutes'
+)
+{% endif %}
+
+SELECT
+    m.channel_name,
+    m.message_date::DATE AS activity_date,
+    COUNT(*) AS message_count,
+    CURRENT_TIMESTAMP AS dbt_updated_at
+FROM {{ ref('stg_telegram_messages') }} m
+{% if is_incremental() %}
+-- A range on message_date, so the day's rows come from its index
+JOIN changed_days c
+    ON m.message_date >= c.activity_date
+    AND m.message_date < c.activity_date + 1
+{% endif %}
+WHERE m.channel_name IS NOT NULL
+GROUP BY 1, 2
@@ -0,0 +1,55 @@
+{{ config(
+    materialized='incremental',
+    schema='marts',
+    unique_key='mention_date',
+    incremental_strategy='delete+insert',
+    indexes=[
+        {'columns': ['mention_date']},
+        {'columns': ['product_label']},
+    ]
+) }}
+
+-- Detections per product per message day. Incremental runs rebuild every
+-- message day with detections written or deleted since the last run, however
+-- old the messages are (whole days, so labels that disappeared are dropped too).
+
+{% if is_incremental() %}
+WITH changed_messages AS (
+    SELECT channel_name, message_id
+    FROM {{ source('raw', 'image_detections') }}
+    WHERE detection_timestamp > (SELECT COALESCE(MAX(dbt_updated_at), '-infinity') FROM {{ this }})
+        - INTERVAL '{{ var("detection_lookback_hours") }} hours'
+    UNION
+    SELECT channel_name, message_id
+    FROM {{ source('raw', 'image_detection_deletions') }}
+    WHERE deleted_at > (SELECT COALESCE(MAX(dbt_updated_at), '-infinity') FROM {{ this }})
+        - INTERVAL '{{ var("detection_lookback_hours") }} hours'
+),
+
+changed_days AS (
+    SELECT DISTINCT m.message_date::DATE AS mention_date
+    FROM changed_messages c
+    JOIN {{ ref('stg_telegram_messages') }} m
+        ON m.channel_name = c.channel_name
+        AND m.message_id = c.message_id
+)
+{% endif %}
+
+SELECT
+    m.message_date::DATE AS mention_date,
+    l.label AS product_label,
+    COUNT(*) AS mention_count,
+    COUNT(DISTINCT (d.channel_name, d.message_id)) AS message_count,
+    CURRENT_TIMESTAMP AS dbt_updated_at
+FROM {{ source('raw', 'image_detections') }} d
+JOIN {{ ref('stg_telegram_messages') }} m
+    ON m.message_id = d.message_id
+    AND m.channel_name = d.channel_name
+{% if is_incremental() %}
+JOIN changed_days c
+    ON m.message_date >= c.mention_date
+    AND m.message_date < c.mention_date + 1
+{% endif %}
+LEFT JOIN {{ source('raw', 'detection_labels') }} l
+    ON l.label_id = d.label_id
+GROUP BY 1, 2
@@ -1,7 +1,26 @@
-{{ config(materialized='table', schema='marts') }}
+{{ config(
+    materialized='incremental',
+    schema='marts',
+    unique_key='channel_id',
+    incremental_strategy='merge',
+    indexes=[
+        {'columns': ['channel_id'], 'unique': True},
+        {'columns': ['channel_name'], 'unique': True},
+    ]
+) }}
 
-SELECT DISTINCT
-    channel_name AS channel_id,
-    channel_name
+-- Incremental runs only look at messages loaded since the last run (read
+-- from the loaded_at index) for channels seen for the first time; channels
+-- that had messages loaded are merged again, which advances the watermark.
+
+SELECT
+    {{ channel_key('channel_name') }} AS channel_id,
+    channel_name,
+    CURRENT_TIMESTAMP AS dbt_updated_at
 FROM {{ ref('stg_telegram_messages') }}
 WHERE channel_name IS NOT NULL
+{% if is_incremental() %}
+    AND loaded_at > (SELECT COALESCE(MAX(dbt_updated_at), '-infinity') FROM {{ this }})
+        - INTERVAL '{{ var("load_lookback_minutes") }} minutes'
+{% endif %}
+GROUP BY channel_name
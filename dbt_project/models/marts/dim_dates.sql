@@ -1,21 +1,32 @@
 {{ config(
-    materialized='table',
-    schema='marts'
+    materialized='incremental',
+    schema='marts',
+    unique_key='date_id',
+    indexes=[
+        {'columns': ['date_id'], 'unique': True},
+        {'columns': ['date'], 'unique': True},
+    ]
 ) }}
 
+-- Fixed calendar between the date_dimension_start/end vars. It is generated
+-- once; later runs only add days when the end of the range is moved out.
+
 WITH date_spine AS (
     SELECT generate_series(
-        (SELECT MIN(message_date)::DATE FROM {{ ref('stg_telegram_messages') }}),
-        (SELECT MAX(message_date)::DATE FROM {{ ref('stg_telegram_messages') }}),
+        DATE '{{ var("date_dimension_start") }}',
+        DATE '{{ var("date_dimension_end") }}',
         INTERVAL '1 day'
-    ) AS date_day
+    )::DATE AS date_day
 )
 SELECT
-    date_day::DATE AS date_id,
-    date_day::DATE AS date,
+    {{ date_key('date_day') }} AS date_id,
+    date_day AS date,
     EXTRACT(YEAR FROM date_day) AS year,
     EXTRACT(MONTH FROM date_day) AS month,
     EXTRACT(DAY FROM date_day) AS day,
     EXTRACT(DOW FROM date_day) AS day_of_week,
     EXTRACT(WEEK FROM date_day) AS week_of_year
 FROM date_spine
+{% if is_incremental() %}
+WHERE date_day > (SELECT MAX(date) FROM {{ this }})
+{% endif %}
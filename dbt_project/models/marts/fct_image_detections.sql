@@ -0,0 +1,49 @@
+{{ config(
+    materialized='incremental',
+    schema='marts',
+    unique_key='detection_id',
+    incremental_strategy='merge',
+    indexes=[
+        {'columns': ['detection_id'], 'unique': True},
+        {'columns': ['channel_id', 'message_id']},
+        {'columns': ['date_id', 'confidence', 'product_label']},
+        {'columns': ['confidence', 'product_label']},
+        {'columns': ['detection_timestamp']},
+    ],
+    post_hook=[
+        "DELETE FROM {{ this }} f
+         USING {{ source('raw', 'image_detection_deletions') }} x
+         WHERE x.detection_id = f.detection_id"
+    ]
+) }}
+
+-- One row per detected object. fct_messages summarises these per message.
+-- The post-hook removes detections a reprocessing run deleted from raw, as
+-- recorded in raw.image_detection_deletions; the (confidence, product_label)
+-- indexes serve filtered top-product queries.
+
+SELECT
+    d.detection_id,
+    d.message_id,
+    {{ channel_key('d.channel_name') }} AS channel_id,
+    {{ date_key('m.message_date') }} AS date_id,
+    d.label_id,
+    l.label AS product_label,
+    d.confidence,
+    d.x,
+    d.y,
+    d.width,
+    d.height,
+    d.model_name,
+    d.model_version,
+    d.detection_timestamp
+FROM {{ source('raw', 'image_detections') }} d
+JOIN {{ ref('stg_telegram_messages') }} m
+    ON m.message_id = d.message_id
+    AND m.channel_name = d.channel_name
+LEFT JOIN {{ source('raw', 'detection_labels') }} l
+    ON l.label_id = d.label_id
+{% if is_incremental() %}
+WHERE d.detection_timestamp > (SELECT COALESCE(MAX(detection_timestamp), '-infinity') FROM {{ this }})
+    - INTERVAL '{{ var("detection_lookback_hours") }} hours'
+{% endif %}
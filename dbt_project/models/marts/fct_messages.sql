@@ -1,31 +1,93 @@
 {{ config(
-    materialized='table',
-    schema='marts'
+    materialized='incremental',
+    schema='marts',
+    unique_key=['channel_id', 'message_id'],
+    incremental_strategy='merge',
+    indexes=[
+        {'columns': ['channel_id', 'message_id'], 'unique': True},
+        {'columns': ['channel_id', 'date_id']},
+        {'columns': ['message_id']},
+        {'columns': ['search_vector'], 'type': 'gin'},
+        {'columns': ['message_text gin_trgm_ops'], 'type': 'gin'},
+        {'columns': ['date_id', 'message_id', 'channel_id']},
+    ]
 ) }}
 
--- SELECT
---     m.message_id,
---     m.channel_name AS channel_id,
---     m.message_date::DATE AS date_id,
---     m.message_text,
---     m.has_media,
---     m.media_type,
---     m.media_path,
---     LENGTH(m.message_text) AS message_length
--- FROM {{ ref('stg_telegram_messages') }} m
--- WHERE m.message_text IS NOT NULL
+-- One row per message. Detections are summarised here; the individual boxes
+-- live in fct_image_detections.
 
+WITH
+{% if is_incremental() %}
+-- Messages loaded since the last run, plus messages whose detections
+-- arrived or were deleted within the lookback window of it. Keyed by channel_name so the
+-- join back to staging uses its (channel_name, message_id) index; the
+-- channel key is only computed for these rows
+changed_messages AS (
+    SELECT channel_name, message_id
+    FROM {{ ref('stg_telegram_messages') }}
+    WHERE loaded_at > (SELECT COALESCE(MAX(loaded_at), '-infinity') FROM {{ this }})
+        - INTERVAL '{{ var("load_lookback_minutes") }} minutes'
+    UNION
+    SELECT c.channel_name, d.message_id
+    FROM {{ ref('fct_image_detections') }} d
+    JOIN {{ ref('dim_channels') }} c
+        ON c.channel_id = d.channel_id
+    WHERE d.detection_timestamp > (SELECT COALESCE(MAX(dbt_updated_at), '-infinity') FROM {{ this }})
+        - INTERVAL '{{ var("detection_lookback_hours") }} hours'
+    UNION
+    SELECT channel_name, message_id
+    FROM {{ source('raw', 'image_detection_deletions') }}
+    WHERE deleted_at > (SELECT COALESCE(MAX(dbt_updated_at), '-infinity') FROM {{ this }})
+        - INTERVAL '{{ var("detection_lookback_hours") }} hours'
+),
+
+changed AS (
+    SELECT channel_name, {{ channel_key('channel_name') }} AS channel_id, message_id
+    FROM changed_messages
+),
+{% endif %}
+
+detections AS (
+    SELECT
+        d.channel_id,
+        d.message_id,
+        ARRAY_AGG(DISTINCT d.product_label ORDER BY d.product_label) AS detected_labels,
+        (ARRAY_AGG(d.product_label ORDER BY d.confidence DESC))[1] AS top_label,
+        MAX(d.confidence) AS max_confidence,
+        COUNT(*) AS detection_count
+    FROM {{ ref('fct_image_detections') }} d
+    {% if is_incremental() %}
+    JOIN changed c
+        ON d.channel_id = c.channel_id
+        AND d.message_id = c.message_id
+    {% endif %}
+    GROUP BY d.channel_id, d.message_id
+)
 
 SELECT
     m.message_id,
-    m.channel_name AS channel_id,  
-    m.message_date::DATE AS date_id,
+    {{ channel_key('m.channel_name') }} AS channel_id,
+    {{ date_key('m.message_date') }} AS date_id,
     m.message_text,
     m.has_media,
     m.media_type,
     m.media_path,
-    d.product_label
+    d.detected_labels,
+    d.top_label,
+    d.max_confidence,
+    COALESCE(d.detection_count, 0) AS detection_count,
+    -- English stems rank highest; the 'simple' config keeps every token
+    -- as-is so Amharic and other non-English words are searchable too
+    setweight(to_tsvector('english', COALESCE(m.message_text, '')), 'A')
+        || setweight(to_tsvector('simple', COALESCE(m.message_text, '')), 'B') AS search_vector,
+    m.loaded_at,
+    CURRENT_TIMESTAMP AS dbt_updated_at
 FROM {{ ref('stg_telegram_messages') }} m
-LEFT JOIN {{ source('raw', 'image_detections') }} d
+{% if is_incremental() %}
+JOIN changed c
+    ON m.channel_name = c.channel_name
+    AND m.message_id = c.message_id
+{% endif %}
+LEFT JOIN detections d
     ON m.message_id = d.message_id
-    AND m.channel_name = d.channel_name
+    AND {{ channel_key('m.channel_name') }} = d.channel_id
@@ -1,6 +1,13 @@
 {{ config(
-    materialized='table',
-    schema='staging'
+    materialized='incremental',
+    schema='staging',
+    unique_key=['channel_name', 'message_id'],
+    incremental_strategy='merge',
+    indexes=[
+        {'columns': ['channel_name', 'message_id'], 'unique': True},
+        {'columns': ['loaded_at']},
+        {'columns': ['message_date']},
+    ]
 ) }}
 
 SELECT
@@ -10,5 +17,12 @@ SELECT
     NULLIF(text, '') AS message_text,
     has_media,
     media_type,
-    media_path
+    media_path,
+    loaded_at
 FROM {{ source('raw', 'telegram_messages') }}
+{% if is_incremental() %}
+-- Only rows the loader inserted or rewrote since the last run, plus any
+-- committed late by a load that overlapped it
+WHERE loaded_at > (SELECT COALESCE(MAX(loaded_at), '-infinity') FROM {{ this }})
+    - INTERVAL '{{ var("load_lookback_minutes") }} minutes'
+{% endif %}
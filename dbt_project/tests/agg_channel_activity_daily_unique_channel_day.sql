@@ -0,0 +1,5 @@
+-- One row per channel and day; returns the duplicated keys
+SELECT channel_name, activity_date
+FROM {{ ref('agg_channel_activity_daily') }}
+GROUP BY channel_name, activity_date
+HAVING COUNT(*) > 1
@@ -0,0 +1,5 @@
+-- One row per message; returns the duplicated keys
+SELECT message_id, channel_id
+FROM {{ ref('fct_messages') }}
+GROUP BY message_id, channel_id
+HAVING COUNT(*) > 1
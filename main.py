@@ -1,44 +1,153 @@
-from fastapi import FastAPI, Depends, Query
-from sqlalchemy.orm import Session
-from scripts.database import SessionLocal
-from scripts.schemas import ProductStat, MessageSchema, ChannelActivitySchema
-from scripts.crud import get_channel_activity, get_top_products, search_messages
+from fastapi import FastAPI, Depends, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from scripts.database import AsyncSessionLocal, async_engine
+from scripts.schemas import ProductStat, MessageSchema, ChannelActivitySchema, MessagePage, DetectionPage
+from scripts.crud import (get_channel_activity, get_channel_names, get_top_products, search_messages,
+                          list_messages, list_detections)
+from scripts.cache import create_response_cache
+from scripts.export import EXPORT_FORMATS, arrow_available, export_dataset
+from scripts.metrics import API_REQUEST_SECONDS, metrics_payload
+from contextlib import asynccontextmanager
+import time
 import logging
-from sqlalchemy import text
+from datetime import date
+from typing import Literal
 from fastapi import HTTPException
 
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-app = FastAPI(title="Telegram Analytics API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Close pooled connections on shutdown
+    await async_engine.dispose()
+
+
+app = FastAPI(title="Telegram Analytics API", lifespan=lifespan)
+
+# Responses are cached until the pipeline publishes a new data version
+response_cache = create_response_cache()
+
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template so path parameters don't create new series
+    route = request.scope.get("route")
+    API_REQUEST_SECONDS.labels(
+        method=request.method,
+        route=route.path if route else "unmatched",
+        status=response.status_code,
+    ).observe(time.perf_counter() - started)
+    return response
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    # API and, with PROMETHEUS_MULTIPROC_DIR, pipeline metrics
+    body, content_type = metrics_payload()
+    return Response(body, media_type=content_type)
+
 
 # Dependency to get DB session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 @app.get("/api/reports/top-products", response_model=list[ProductStat])
-def top_products(limit: int = Query(10, gt=0, le=100), db: Session = Depends(get_db)):
-    return get_top_products(db, limit)
+async def top_products(
+    request: Request,
+    limit: int = Query(10, gt=0, le=100),
+    min_confidence: float | None = Query(None, ge=0, le=1),
+    start_date: date | None = None,
+    end_date: date | None = None,
+    db: AsyncSession = Depends(get_db),
+):
+    params = {"limit": limit, "min_confidence": min_confidence,
+              "start_date": start_date, "end_date": end_date}
+    return await response_cache.respond(
+        request, db, "top_products", params,
+        lambda: get_top_products(db, limit, min_confidence, start_date, end_date), list[ProductStat])
 
 @app.get("/api/search/messages", response_model=list[MessageSchema])
-def messages_search(query: str, db: Session = Depends(get_db)):
-    return search_messages(db, query)
+async def messages_search(
+    request: Request,
+    query: str = Query(..., min_length=1),
+    channel: str | None = None,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    limit: int = Query(50, gt=0, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db),
+):
+    params = {"query": query, "channel": channel, "start_date": start_date,
+              "end_date": end_date, "limit": limit, "offset": offset}
+    return await response_cache.respond(
+        request, db, "search_messages", params,
+        lambda: search_messages(db, query, channel, start_date, end_date, limit, offset),
+        list[MessageSchema])
 
 @app.get("/api/channels/{channel_name}/activity", response_model=list[ChannelActivitySchema])
-def channel_activity(channel_name: str, db: Session = Depends(get_db)):
-    return get_channel_activity(db, channel_name)
+async def channel_activity(request: Request, channel_name: str, db: AsyncSession = Depends(get_db)):
+    return await response_cache.respond(
+        request, db, "channel_activity", {"channel_name": channel_name},
+        lambda: get_channel_activity(db, channel_name), list[ChannelActivitySchema])
 
 @app.get("/channels/", response_model=list[str])
-def get_channels(db: Session = Depends(get_db)):
+async def get_channels(request: Request, db: AsyncSession = Depends(get_db)):
     try:
-        result = db.execute(text("SELECT channel_name FROM public_marts.dim_channels"))
-        channels = [row[0] for row in result]
-        return channels
+        return await response_cache.respond(
+            request, db, "channels", {}, lambda: get_channel_names(db), list[str])
     except Exception as e:
         logger.exception("Channels query failed")
         raise HTTPException(status_code=500, detail="Channels query failed")
+
+@app.get("/api/messages", response_model=MessagePage)
+async def messages_page(
+    channel: str | None = None,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    cursor: str | None = None,
+    limit: int = Query(100, gt=0, le=1000),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        return await list_messages(db, channel, start_date, end_date, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/detections", response_model=DetectionPage)
+async def detections_page(
+    channel: str | None = None,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    cursor: str | None = None,
+    limit: int = Query(100, gt=0, le=1000),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        return await list_detections(db, channel, start_date, end_date, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/export/{dataset}")
+async def export_data(
+    dataset: Literal["messages", "detections"],
+    format: Literal["ndjson", "csv", "arrow"] = "ndjson",
+    channel: str | None = None,
+    start_date: date | None = None,
+    end_date: date | None = None,
+):
+    if format == "arrow" and not arrow_available():
+        raise HTTPException(status_code=400, detail="Arrow export requires pyarrow on the server")
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        export_dataset(dataset, format, channel, start_date, end_date),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{dataset}.{extension}"'},
+    )
@@ -0,0 +1,9 @@
+"""Pipeline scripts, run from the repository root as ``python -m scripts.<name>``.
+
+The modules read their settings from the environment when imported, and
+PROMETHEUS_MULTIPROC_DIR must be set before scripts.metrics creates its
+metrics, so .env is loaded here, before any of them.
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import text
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # redis is only needed for the redis backend
+    redis = None
+
+# "memory" (per-process LRU) or "redis" (shared between API workers)
+CACHE_BACKEND = os.getenv("API_CACHE_BACKEND", "memory")
+CACHE_TTL_SECONDS = int(os.getenv("API_CACHE_TTL_SECONDS", "3600"))
+CACHE_MAX_ENTRIES = int(os.getenv("API_CACHE_MAX_ENTRIES", "1024"))
+REDIS_URL = os.getenv("API_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+# How long the API trusts its last read of the pipeline's data version
+DATA_VERSION_CHECK_SECONDS = float(os.getenv("API_CACHE_VERSION_CHECK_SECONDS", "30"))
+
+
+class MemoryCache:
+    """Thread-safe in-process LRU cache with a per-entry TTL."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    async def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class RedisCache:
+    """Cache stored in Redis (or any Redis-compatible server)."""
+
+    def __init__(self, url=REDIS_URL, prefix="telegram-api:"):
+        if redis is None:
+            raise RuntimeError("API_CACHE_BACKEND=redis requires the 'redis' package")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key):
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key, value, ttl):
+        await self.client.set(self.prefix + key, value, ex=ttl)
+
+
+@lru_cache(maxsize=None)
+def _adapter(response_model):
+    return TypeAdapter(response_model)
+
+
+def etag_matches(if_none_match, etag):
+    """Return True if an If-None-Match header value is ``*`` or lists ``etag``.
+
+    Entity tags are compared weakly, as If-None-Match requires, so a ``W/``
+    prefix on either side is ignored.
+    """
+    etag = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """Caches serialized endpoint responses per pipeline data version.
+
+    The dbt run bumps public.pipeline_data_version when it finishes (see
+    the bump_data_version macro). The version is part of every cache key
+    and ETag, so a new version invalidates all cached responses at once
+    and clients holding the current ETag get a 304 without a body.
+    """
+
+    def __init__(self, backend, ttl=CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self._version = None
+        self._version_checked_at = 0.0
+
+    async def data_version(self, db):
+        """Return the pipeline's data version, re-reading it at most every few seconds."""
+        if (self._version is not None
+                and time.monotonic() - self._version_checked_at < DATA_VERSION_CHECK_SECONDS):
+            return self._version
+
+        version = 0
+        if (await db.execute(text("SELECT to_regclass('public.pipeline_data_version')"))).scalar():
+            version = (await db.execute(text("SELECT version FROM public.pipeline_data_version"))).scalar() or 0
+
+        self._version = version
+        self._version_checked_at = time.monotonic()
+        return version
+
+    async def respond(self, request: Request, db, endpoint, params, loader, response_model):
+        """Return the cached response for an endpoint call, awaiting ``loader()`` on a miss.
+
+        The loader's result is validated and filtered through
+        ``response_model`` before it is serialized and cached, as FastAPI
+        would for a route returning it directly.
+        """
+        version = await self.data_version(db)
+        key = f"{endpoint}:{version}:{json.dumps(params, sort_keys=True, default=str)}"
+        etag = '"' + hashlib.sha1(key.encode("utf-8")).hexdigest() + '"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=headers)
+
+        body = await self.backend.get(key)
+        if body is None:
+            adapter = _adapter(response_model)
+            body = adapter.dump_json(adapter.validate_python(await loader()))
+            await self.backend.set(key, body, self.ttl)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+def create_response_cache():
+    """Build the response cache for the configured backend."""
+    backend = RedisCache() if CACHE_BACKEND == "redis" else MemoryCache()
+    return ResponseCache(backend)
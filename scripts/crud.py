@@ -1,24 +1,95 @@
+import json
+import base64
 from sqlalchemy import text
-from datetime import date
-
-def get_top_products(db, limit=10):
-    result = db.execute(text("""
-        SELECT product_label, COUNT(*) AS mention_count
-        FROM raw.image_detections
-        GROUP BY product_label
-        ORDER BY mention_count DESC
-        LIMIT :limit
-    """), {"limit": limit})
+from datetime import date, datetime, time, timedelta, timezone
+
+# Fixed queries are built once so SQLAlchemy's compiled cache and asyncpg's
+# per-connection prepared statement cache are reused across requests
+CHANNEL_ACTIVITY_QUERY = text("""
+    SELECT activity_date, message_count
+    FROM public_marts.agg_channel_activity_daily
+    WHERE channel_name = :channel_name
+    ORDER BY activity_date;
+""")
+
+CHANNEL_NAMES_QUERY = text("SELECT channel_name FROM public_marts.dim_channels")
+
+
+async def get_top_products(db, limit=10, min_confidence=None, start_date: date = None, end_date: date = None):
+    params = {"limit": limit}
+    if min_confidence is None:
+        # The daily aggregate maintained by dbt, indexed on mention_date
+        conditions = ["product_label IS NOT NULL"]
+        _filters(conditions, params, None, "mention_date", None, start_date, end_date)
+        query = f"""
+            SELECT product_label, SUM(mention_count) AS mention_count
+            FROM public_marts.agg_product_mentions_daily
+            WHERE {" AND ".join(conditions)}
+            GROUP BY product_label
+            ORDER BY mention_count DESC
+            LIMIT :limit
+        """
+    else:
+        # Individual detections, read from the (date_id, confidence, product_label)
+        # or (confidence, product_label) index
+        conditions = ["d.product_label IS NOT NULL", "d.confidence >= :min_confidence"]
+        params["min_confidence"] = min_confidence
+        _filters(conditions, params, None, "d.date_id", None, start_date, end_date, to_date=date_key)
+        query = f"""
+            SELECT d.product_label, COUNT(*) AS mention_count
+            FROM public_marts.fct_image_detections d
+            WHERE {" AND ".join(conditions)}
+            GROUP BY d.product_label
+            ORDER BY mention_count DESC
+            LIMIT :limit
+        """
+    result = await db.execute(text(query), params)
     return [{"product_label": row[0], "mention_count": row[1]} for row in result]
 
-def search_messages(db, query):
-    result = db.execute(text("""
-        SELECT f.message_id, c.channel_name, f.message_text, f.has_media, f.media_type, f.media_path
+def date_key(value: date):
+    """Return the YYYYMMDD integer key dim_dates and the fact tables use for a date."""
+    return value.year * 10000 + value.month * 100 + value.day
+
+
+def _escape_like(value):
+    """Escape LIKE wildcards so user input matches literally."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+async def search_messages(db, query, channel_name=None, start_date: date = None, end_date: date = None,
+                          limit=50, offset=0):
+    # Full-text match on the english and simple (language-agnostic) vectors;
+    # queries of 3+ characters also match substrings through the trigram index
+    conditions = ["(f.search_vector @@ q.english OR f.search_vector @@ q.simple"
+                  + (" OR f.message_text ILIKE :pattern)" if len(query) >= 3 else ")")]
+    params = {"query": query, "limit": limit, "offset": offset}
+    if len(query) >= 3:
+        params["pattern"] = f"%{_escape_like(query)}%"
+
+    if channel_name:
+        conditions.append("c.channel_name = :channel_name")
+        params["channel_name"] = channel_name
+    if start_date:
+        conditions.append("f.date_id >= :start_date")
+        params["start_date"] = date_key(start_date)
+    if end_date:
+        conditions.append("f.date_id <= :end_date")
+        params["end_date"] = date_key(end_date)
+
+    result = await db.execute(text(f"""
+        WITH q AS (
+            SELECT websearch_to_tsquery('english', :query) AS english,
+                   websearch_to_tsquery('simple', :query) AS simple
+        )
+        SELECT f.message_id, c.channel_name, f.message_text, f.has_media, f.media_type, f.media_path,
+               ts_rank_cd(f.search_vector, q.english || q.simple) AS rank
         FROM public_marts.fct_messages f
         JOIN public_marts.dim_channels c ON f.channel_id = c.channel_id
-        WHERE f.message_text ILIKE :query
-        LIMIT 50
-    """), {"query": f"%{query}%"})
+        CROSS JOIN q
+        WHERE {" AND ".join(conditions)}
+        ORDER BY rank DESC, f.date_id DESC, f.message_id DESC
+        LIMIT :limit OFFSET :offset
+    """), params)
 
     # This works by mapping row keys to values
     rows = result.mappings().all()
@@ -26,18 +97,9 @@ def search_messages(db, query):
     return [dict(row) for row in rows]
 
 
-def get_channel_activity(db, channel_name: str):
-    query = text("""
-        SELECT d.date, COUNT(*) as message_count
-        FROM public_marts.fct_messages f
-        JOIN public_marts.dim_dates d ON f.date_id = d.date_id
-        JOIN public_marts.dim_channels c ON f.channel_id = c.channel_id
-        WHERE c.channel_name = :channel_name
-        GROUP BY d.date
-        ORDER BY d.date;
-    """)
-
-    result = db.execute(query, {"channel_name": channel_name})
+async def get_channel_activity(db, channel_name: str):
+    # Index lookup on the daily aggregate maintained by dbt
+    result = await db.execute(CHANNEL_ACTIVITY_QUERY, {"channel_name": channel_name})
     return [
         {
             "date": row[0].isoformat(),  # ← convert date → string
@@ -45,3 +107,129 @@ def get_channel_activity(db, channel_name: str):
         }
         for row in result.fetchall()
     ]
+
+
+async def get_channel_names(db):
+    result = await db.execute(CHANNEL_NAMES_QUERY)
+    return [row[0] for row in result]
+
+
+def encode_cursor(values):
+    """Encode the keyset of the last row on a page as an opaque cursor."""
+    raw = json.dumps(values, default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor; raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def _filters(conditions, params, channel_column, date_column, channel_name, start_date, end_date,
+             to_date=lambda value: value):
+    """Append the optional channel and date range filters shared by list and export queries.
+
+    ``to_date`` converts the dates to the column's representation, e.g. ``date_key``.
+    """
+    if channel_name:
+        conditions.append(f"{channel_column} = :channel_name")
+        params["channel_name"] = channel_name
+    if start_date:
+        conditions.append(f"{date_column} >= :start_date")
+        params["start_date"] = to_date(start_date)
+    if end_date:
+        conditions.append(f"{date_column} <= :end_date")
+        params["end_date"] = to_date(end_date)
+
+
+def messages_query(channel_name=None, start_date: date = None, end_date: date = None,
+                   after=None, limit=None):
+    """Build the keyset-ordered messages query used for paging and export."""
+    conditions, params = [], {}
+    _filters(conditions, params, "c.channel_name", "f.date_id", channel_name, start_date, end_date,
+             to_date=date_key)
+    if after:
+        conditions.append("(f.date_id, f.message_id, f.channel_id) > (:after_date, :after_message_id, :after_channel_id)")
+        params.update(after_date=date_key(date.fromisoformat(after[0])), after_message_id=int(after[1]),
+                      after_channel_id=int(after[2]))
+    if limit:
+        params["limit"] = limit
+
+    query = text(f"""
+        SELECT dd.date, f.message_id, f.channel_id, c.channel_name, f.message_text,
+               f.has_media, f.media_type, f.media_path,
+               f.detected_labels, f.top_label, f.max_confidence, f.detection_count
+        FROM public_marts.fct_messages f
+        JOIN public_marts.dim_channels c ON f.channel_id = c.channel_id
+        JOIN public_marts.dim_dates dd ON f.date_id = dd.date_id
+        {"WHERE " + " AND ".join(conditions) if conditions else ""}
+        ORDER BY f.date_id, f.message_id, f.channel_id
+        {"LIMIT :limit" if limit else ""}
+    """)
+    return query, params
+
+
+def detections_query(channel_name=None, start_date: date = None, end_date: date = None,
+                     after=None, limit=None):
+    """Build the keyset-ordered detections query used for paging and export."""
+    conditions, params = [], {}
+    _filters(conditions, params, "d.channel_name", None, channel_name, None, None)
+    # Bare timestamp bounds (no ::DATE cast) let the planner prune partitions
+    if start_date:
+        conditions.append("d.detection_timestamp >= :start_time")
+        params["start_time"] = datetime.combine(start_date, time.min, tzinfo=timezone.utc)
+    if end_date:
+        conditions.append("d.detection_timestamp < :end_time")
+        params["end_time"] = datetime.combine(end_date + timedelta(days=1), time.min, tzinfo=timezone.utc)
+    if after:
+        conditions.append("d.detection_id > :after_detection_id")
+        params["after_detection_id"] = int(after[0])
+    if limit:
+        params["limit"] = limit
+
+    query = text(f"""
+        SELECT d.detection_id, d.message_id, d.channel_name, l.label AS product_label, d.confidence,
+               d.x, d.y, d.width, d.height, d.model_name, d.model_version, d.detection_timestamp
+        FROM raw.image_detections d
+        LEFT JOIN raw.detection_labels l ON l.label_id = d.label_id
+        {"WHERE " + " AND ".join(conditions) if conditions else ""}
+        ORDER BY d.detection_id
+        {"LIMIT :limit" if limit else ""}
+    """)
+    return query, params
+
+
+async def list_messages(db, channel_name=None, start_date: date = None, end_date: date = None,
+                        cursor=None, limit=100):
+    # One extra row tells whether another page follows
+    after = decode_cursor(cursor) if cursor else None
+    try:
+        query, params = messages_query(channel_name, start_date, end_date, after, limit + 1)
+    except (ValueError, LookupError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    rows = (await db.execute(query, params)).mappings().all()
+
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor([last["date"].isoformat(), last["message_id"], last["channel_id"]])
+    return {"items": items, "next_cursor": next_cursor}
+
+
+async def list_detections(db, channel_name=None, start_date: date = None, end_date: date = None,
+                          cursor=None, limit=100):
+    after = decode_cursor(cursor) if cursor else None
+    try:
+        query, params = detections_query(channel_name, start_date, end_date, after, limit + 1)
+    except (ValueError, LookupError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    rows = (await db.execute(query, params)).mappings().all()
+
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = encode_cursor([items[-1]["detection_id"]]) if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
@@ -1,28 +1,24 @@
 import os
 import json
+import time
+import hashlib
 import logging
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
 import psycopg2
 from psycopg2.extras import execute_values
-from dotenv import load_dotenv
-from ultralytics import YOLO
-from pathlib import Path
+from scripts.logging_config import configure_logging
+from scripts.metrics import (IMAGES_PROCESSED, DETECTIONS_WRITTEN, CACHE_LOOKUPS, STAGE_SECONDS,
+                             INFERENCE_SECONDS, DB_WRITE_SECONDS, THROUGHPUT, ProgressLog, timed)
+from scripts.model_registry import EXPORT_FORMAT, EXPORT_FORMATS, MODEL_NAME, get_model, model_version
+from scripts.partitions import (set_aside_unpartitioned, ensure_partitions, migrate_rows,
+                                drop_partitions_before, retention_cutoff, upcoming_months)
 
-# Configure logging
+# Handlers are attached by configure_logging() when enrichment starts
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-
-file_handler = logging.FileHandler('logs/yolo_enrichment.log')
-file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-
-logger.handlers = []
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
-
-# Load environment variables
-load_dotenv()
 
 # PostgreSQL connection parameters
 db_params = {
@@ -33,25 +29,159 @@ db_params = {
     'port': os.getenv('POSTGRES_PORT')
 }
 
-# Load YOLOv8 model (pre-trained, suitable for e-commerce products)
-model = YOLO('yolov8n.pt')  # Use yolov8n (nano) for lightweight detection
+# Version recorded with every processed image; the model itself (yolov8n by
+# default) is loaded from the registry on first use, not at import
+MODEL_VERSION = model_version()
+
+# Images passed to the model per inference call
+BATCH_SIZE = int(os.getenv("YOLO_BATCH_SIZE", "16"))
+
+# Threads decoding images ahead of inference
+DECODE_WORKERS = int(os.getenv("YOLO_DECODE_WORKERS", "4"))
+
+# Candidate rows fetched per round trip from the server-side cursor
+FETCH_SIZE = 2000
+
+# Detections are written and committed after this many processed images
+COMMIT_IMAGES = int(os.getenv("YOLO_COMMIT_IMAGES", "500"))
+
+# Boxes below this confidence are not stored. The model already drops
+# boxes under 0.25; the cache keeps everything it returned, so the
+# threshold can be changed without running the model again
+MIN_CONFIDENCE = float(os.getenv("YOLO_MIN_CONFIDENCE", "0.4"))
+
+# label -> label_id in raw.detection_labels, filled as labels are first written
+_label_ids = {}
+
+# Near-duplicate images match cached detections when their perceptual
+# hashes differ in at most this many bits (must stay below 4, see
+# lookup_cached_detections)
+PHASH_MAX_DISTANCE = 3
+
+# Decoded images are downscaled so their longest side is at most this;
+# boxes are scaled back to original image coordinates
+MAX_IMAGE_SIDE = 640
+
+# Days deleted detections stay in raw.image_detection_deletions; dbt must
+# run within this window to remove them from the marts
+DELETION_LOG_DAYS = int(os.getenv("YOLO_DELETION_LOG_DAYS", "7"))
 
 
 def create_image_detections_table(conn):
-    """Create the raw.image_detections table if it doesn't exist."""
+    """Create the raw.image_detections table if it doesn't exist.
+
+    Detections are range-partitioned by month on detection_timestamp and
+    store a label id from raw.detection_labels and typed box columns. A
+    plain table left by an earlier version is migrated into the
+    partitioned one, and JSONB boxes are converted (see structure_detections).
+    """
     try:
         with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('raw.image_detection_runs')")
+            ledger_is_new = cur.fetchone()[0] is None
+
+            cur.execute("CREATE SCHEMA IF NOT EXISTS raw")
+            legacy_table = set_aside_unpartitioned(cur, "raw.image_detections")
             cur.execute("""
-                CREATE SCHEMA IF NOT EXISTS raw;
+                CREATE TABLE IF NOT EXISTS raw.detection_labels (
+                    label_id SMALLSERIAL PRIMARY KEY,
+                    label VARCHAR(100) NOT NULL UNIQUE
+                );
+                -- Box coordinates are in pixels of the original image
                 CREATE TABLE IF NOT EXISTS raw.image_detections (
+                    detection_id BIGSERIAL,
                     message_id BIGINT,
                     channel_name VARCHAR(255),
-                    product_label VARCHAR(100),
-                    confidence FLOAT,
-                    bounding_box JSONB,
-                    detection_timestamp TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                    label_id SMALLINT REFERENCES raw.detection_labels (label_id),
+                    confidence REAL,
+                    x REAL,
+                    y REAL,
+                    width REAL,
+                    height REAL,
+                    model_name VARCHAR(100),
+                    model_version VARCHAR(50),
+                    detection_timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (detection_id, detection_timestamp)
+                ) PARTITION BY RANGE (detection_timestamp);
+                CREATE TABLE IF NOT EXISTS raw.image_detections_default
+                    PARTITION OF raw.image_detections DEFAULT;
+                -- Lets dbt find detections written since its last run
+                CREATE INDEX IF NOT EXISTS image_detections_detection_timestamp_idx
+                    ON raw.image_detections (detection_timestamp);
+                -- Finds an image's earlier detections when a new model replaces them
+                CREATE INDEX IF NOT EXISTS image_detections_message_idx
+                    ON raw.image_detections (channel_name, message_id);
+                -- Detections deleted by a reprocessing run, so dbt can remove
+                -- them from the marts without comparing against all of raw
+                CREATE TABLE IF NOT EXISTS raw.image_detection_deletions (
+                    detection_id BIGINT NOT NULL,
+                    message_id BIGINT NOT NULL,
+                    channel_name VARCHAR(255) NOT NULL,
+                    deleted_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT clock_timestamp()
                 );
+                CREATE INDEX IF NOT EXISTS image_detection_deletions_deleted_at_idx
+                    ON raw.image_detection_deletions (deleted_at);
+                CREATE TABLE IF NOT EXISTS raw.image_detection_runs (
+                    message_id BIGINT NOT NULL,
+                    channel_name VARCHAR(255) NOT NULL,
+                    model_name VARCHAR(100) NOT NULL,
+                    model_version VARCHAR(50) NOT NULL,
+                    detection_count INTEGER NOT NULL,
+                    processed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (channel_name, message_id, model_name, model_version)
+                );
+                CREATE TABLE IF NOT EXISTS raw.image_detection_cache (
+                    file_hash CHAR(64) NOT NULL,
+                    model_name VARCHAR(100) NOT NULL,
+                    model_version VARCHAR(50) NOT NULL,
+                    phash BIGINT,
+                    image_width INTEGER NOT NULL,
+                    image_height INTEGER NOT NULL,
+                    detections JSONB NOT NULL,
+                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (file_hash, model_name, model_version)
+                );
+                CREATE INDEX IF NOT EXISTS image_detection_cache_phash_0
+                    ON raw.image_detection_cache ((phash & 65535));
+                CREATE INDEX IF NOT EXISTS image_detection_cache_phash_1
+                    ON raw.image_detection_cache (((phash >> 16) & 65535));
+                CREATE INDEX IF NOT EXISTS image_detection_cache_phash_2
+                    ON raw.image_detection_cache (((phash >> 32) & 65535));
+                CREATE INDEX IF NOT EXISTS image_detection_cache_phash_3
+                    ON raw.image_detection_cache (((phash >> 48) & 65535));
             """)
+            if structure_detections(cur, "raw.image_detections"):
+                logger.info("Converted raw.image_detections boxes and labels to typed columns")
+            ensure_partitions(cur, "raw.image_detections", upcoming_months())
+
+            if legacy_table:
+                structure_detections(cur, legacy_table)
+                copied = migrate_rows(cur, legacy_table, "raw.image_detections")
+                # Continue numbering after the migrated detection ids
+                cur.execute("""
+                    SELECT setval(pg_get_serial_sequence('raw.image_detections', 'detection_id'),
+                                  COALESCE(MAX(detection_id), 0) + 1, false)
+                    FROM raw.image_detections;
+                """)
+                logger.info(f"Migrated {copied} detections into the partitioned raw.image_detections table")
+
+            # Detections stored before the ledger existed all came from yolov8n;
+            # record them so they are not processed again
+            if ledger_is_new:
+                cur.execute("""
+                    UPDATE raw.image_detections SET model_name = 'yolov8n.pt'
+                    WHERE model_name IS NULL;
+                """)
+                cur.execute("""
+                    INSERT INTO raw.image_detection_runs
+                        (message_id, channel_name, model_name, model_version, detection_count)
+                    SELECT message_id, channel_name, 'yolov8n.pt', %s, COUNT(*)
+                    FROM raw.image_detections
+                    WHERE model_name = 'yolov8n.pt'
+                    GROUP BY message_id, channel_name
+                    ON CONFLICT DO NOTHING;
+                """, (MODEL_VERSION,))
+                logger.info(f"Recorded {cur.rowcount} previously enriched images in raw.image_detection_runs")
             conn.commit()
             logger.info("Created raw.image_detections table")
     except Exception as e:
@@ -60,79 +190,555 @@ def create_image_detections_table(conn):
         raise
 
 
-def enrich_images_with_yolo():
-    """Run YOLOv8 on images and store detections in PostgreSQL."""
+def structure_detections(cur, table):
+    """Convert a detections table with product_label and JSONB bounding_box to the typed layout.
+
+    Labels move to raw.detection_labels and are referenced by label_id,
+    boxes are split into REAL x/y/width/height columns, and model_version
+    is taken from the image's ledger entry (model_name is added first if
+    the table predates it). Tables already in the typed layout are left
+    alone. Returns True if ``table`` was converted.
+    """
+    schema, name = table.split(".")
+    cur.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = %s AND table_name = %s AND column_name = 'bounding_box'
+    """, (schema, name))
+    if cur.fetchone() is None:
+        return False
+
+    # On a partitioned table every statement applies to all partitions
+    cur.execute(f"""
+        INSERT INTO raw.detection_labels (label)
+        SELECT DISTINCT product_label FROM {table} WHERE product_label IS NOT NULL
+        ON CONFLICT (label) DO NOTHING;
+        ALTER TABLE {table}
+            ADD COLUMN IF NOT EXISTS label_id SMALLINT REFERENCES raw.detection_labels (label_id),
+            ADD COLUMN IF NOT EXISTS x REAL,
+            ADD COLUMN IF NOT EXISTS y REAL,
+            ADD COLUMN IF NOT EXISTS width REAL,
+            ADD COLUMN IF NOT EXISTS height REAL,
+            ADD COLUMN IF NOT EXISTS model_version VARCHAR(50),
+            -- Missing from tables created before the ledger existed
+            ADD COLUMN IF NOT EXISTS model_name VARCHAR(100),
+            ALTER COLUMN confidence TYPE REAL;
+        UPDATE {table} d SET
+            label_id = (SELECT l.label_id FROM raw.detection_labels l WHERE l.label = d.product_label),
+            x = (d.bounding_box ->> 'x')::REAL,
+            y = (d.bounding_box ->> 'y')::REAL,
+            width = (d.bounding_box ->> 'width')::REAL,
+            height = (d.bounding_box ->> 'height')::REAL,
+            -- Images processed before the ledger existed are recorded with this version
+            model_version = COALESCE((
+                SELECT MAX(r.model_version) FROM raw.image_detection_runs r
+                WHERE r.channel_name = d.channel_name AND r.message_id = d.message_id
+                  AND r.model_name = d.model_name
+            ), %s);
+        ALTER TABLE {table} DROP COLUMN product_label, DROP COLUMN bounding_box;
+    """, (MODEL_VERSION,))
+    return True
+
+
+def label_ids(cur, labels):
+    """Return {label: label_id} covering ``labels``, adding new labels to raw.detection_labels."""
+    missing = [label for label in set(labels) if label not in _label_ids]
+    if missing:
+        execute_values(
+            cur,
+            "INSERT INTO raw.detection_labels (label) VALUES %s ON CONFLICT (label) DO NOTHING",
+            [(label,) for label in missing]
+        )
+        cur.execute("SELECT label, label_id FROM raw.detection_labels WHERE label = ANY(%s)", (missing,))
+        _label_ids.update(cur.fetchall())
+    return _label_ids
+
+
+def perceptual_hash(image):
+    """Return a 64-bit difference hash of an image as a signed BIGINT.
+
+    Resized copies and re-encodes of the same photo hash to values that
+    differ in only a few bits.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def phash_bands(phash):
+    """Split a perceptual hash into its four 16-bit bands, lowest first."""
+    return [(phash >> shift) & 65535 for shift in (0, 16, 32, 48)]
+
+
+def phash_distance(first, second):
+    """Return the number of bits in which two perceptual hashes differ."""
+    return bin((first ^ second) & ((1 << 64) - 1)).count("1")
+
+
+def load_image(media_path, with_phash=False):
+    """Read, hash and decode an image, downscaling it for inference.
+
+    Returns (image, scale, file_hash, phash), or None if the file is
+    missing or cannot be decoded. ``phash`` is None unless requested.
+    """
     try:
-        # Connect to PostgreSQL
+        with open(media_path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+
+    file_hash = hashlib.sha256(data).hexdigest()
+    phash = perceptual_hash(image) if with_phash else None
+    height, width = image.shape[:2]
+    scale = min(1.0, MAX_IMAGE_SIDE / max(height, width))
+    if scale < 1.0:
+        image = cv2.resize(image, (round(width * scale), round(height * scale)),
+                           interpolation=cv2.INTER_AREA)
+    return image, scale, file_hash, phash
+
+
+def iter_image_batches(image_records, batch_size=BATCH_SIZE, workers=DECODE_WORKERS, with_phash=False):
+    """Yield batches of (record, image, scale, file_hash, phash), decoding ahead on a thread pool.
+
+    Up to two batches are decoded ahead of the one being yielded, so
+    inference never waits on decoding unless the disk is the bottleneck.
+    Records whose image cannot be read are logged and left out.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending = deque()
+        batch = []
+        records = iter(image_records)
+        exhausted = False
+
+        while pending or not exhausted:
+            while not exhausted and len(pending) < batch_size * 2:
+                record = next(records, None)
+                if record is None:
+                    exhausted = True
+                    break
+                pending.append((record, executor.submit(load_image, record[2], with_phash)))
+            if not pending:
+                break
+
+            record, future = pending.popleft()
+            loaded = future.result()
+            if loaded is None:
+                logger.warning(f"Image not found or unreadable: {record[2]}")
+                continue
+            batch.append((record, *loaded))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+
+
+def image_size(item):
+    """Return the original (width, height) of a decoded batch item."""
+    _, image, scale, _, _ = item
+    height, width = image.shape[:2]
+    return round(width / scale), round(height / scale)
+
+
+def detect_batch(detector, batch):
+    """Run YOLOv8 on a batch of decoded images.
+
+    Returns (item, boxes) for every image that went through the model,
+    where boxes is a list of [product_label, confidence, x, y, width,
+    height] in original image coordinates. If the batch fails, its images
+    are retried one at a time so a single bad image only loses itself.
+    """
+    try:
+        results = detector([item[1] for item in batch], verbose=False)
+    except Exception as e:
+        if len(batch) == 1:
+            logger.error(f"Failed to process image {batch[0][0][2]}: {str(e)}")
+            return []
+        logger.warning(f"Batch inference failed, retrying images one by one: {str(e)}")
+        return [detected for item in batch for detected in detect_batch(detector, [item])]
+
+    detected = []
+    for item, result in zip(batch, results):
+        (_, _, media_path), _, scale, _, _ = item
+        boxes = []
+        for box in result.boxes:
+            product_label = result.names[int(box.cls)]
+            confidence = float(box.conf)
+            x1, y1, x2, y2 = (float(value) / scale for value in box.xyxy[0])
+            boxes.append([product_label, confidence, x1, y1, x2 - x1, y2 - y1])
+            logger.debug(f"Detected {product_label} in {media_path} with confidence {confidence}")
+        detected.append((item, boxes))
+    return detected
+
+
+def lookup_cached_detections(cur, batch, model_name, with_phash, pending_cache):
+    """Find cached detections for a batch by file hash, then by perceptual hash.
+
+    ``pending_cache`` holds entries produced since the last commit and is
+    searched first. For near-duplicates in the database the 64-bit hash is
+    split into four 16-bit bands: two hashes within PHASH_MAX_DISTANCE (< 4)
+    bits share at least one band, so candidates come from the band indexes
+    and are then compared exactly.
+
+    Returns ({batch index: boxes}, number of perceptual-hash hits).
+    """
+    hits = {}
+    hashes = list({item[3] for item in batch} - set(pending_cache))
+    cached = {}
+    if hashes:
+        # Cast to the column's type so the primary key index can be used
+        cur.execute("""
+            SELECT file_hash, image_width, image_height, detections
+            FROM raw.image_detection_cache
+            WHERE file_hash = ANY(%s::CHAR(64)[]) AND model_name = %s AND model_version = %s
+        """, (hashes, model_name, MODEL_VERSION))
+        cached = {row[0]: (row[1], row[2], row[3]) for row in cur.fetchall()}
+
+    phash_hits = 0
+    for index, item in enumerate(batch):
+        file_hash, phash = item[3], item[4]
+        entry = pending_cache[file_hash][:3] if file_hash in pending_cache else cached.get(file_hash)
+        if entry is None and with_phash and phash is not None:
+            entry = next((pending[:3] for pending in pending_cache.values()
+                          if pending[3] is not None and phash_distance(pending[3], phash) <= PHASH_MAX_DISTANCE),
+                         None)
+            if entry is not None:
+                phash_hits += 1
+        if entry is None and with_phash and phash is not None:
+            cur.execute("""
+                SELECT phash, image_width, image_height, detections
+                FROM raw.image_detection_cache
+                WHERE model_name = %s AND model_version = %s
+                  AND ((phash & 65535) = %s OR ((phash >> 16) & 65535) = %s
+                       OR ((phash >> 32) & 65535) = %s OR ((phash >> 48) & 65535) = %s)
+            """, (model_name, MODEL_VERSION, *phash_bands(phash)))
+            for candidate, width, height, boxes in cur.fetchall():
+                if phash_distance(candidate, phash) <= PHASH_MAX_DISTANCE:
+                    entry = (width, height, boxes)
+                    phash_hits += 1
+                    break
+        if entry is None:
+            continue
+
+        # Scale boxes from the cached image's size to this one's
+        cached_width, cached_height, boxes = entry
+        width, height = image_size(item)
+        sx, sy = width / cached_width, height / cached_height
+        hits[index] = [[label, confidence, x * sx, y * sy, w * sx, h * sy]
+                       for label, confidence, x, y, w, h in boxes]
+    return hits, phash_hits
+
+
+def process_batch(cur, detector, batch, model_name, with_phash, pending_cache, cache_stats,
+                  min_confidence=MIN_CONFIDENCE):
+    """Get detections for a batch from the cache or, on a miss, from the model.
+
+    Returns (detections, processed) ready for write_results, keeping only
+    boxes with at least ``min_confidence``; new cache entries are added to
+    ``pending_cache`` as {file_hash: (width, height, boxes, phash)} with
+    every box the model returned.
+    """
+    hits, phash_hits = lookup_cached_detections(cur, batch, model_name, with_phash, pending_cache)
+    results = [(batch[index], boxes) for index, boxes in hits.items()]
+
+    # Identical files within the batch only go through the model once
+    misses = [item for index, item in enumerate(batch) if index not in hits]
+    unique_misses = {}
+    for item in misses:
+        unique_misses.setdefault(item[3], item)
+    if unique_misses:
+        with timed(INFERENCE_SECONDS, model=model_name):
+            detected = detect_batch(detector, list(unique_misses.values()))
+        for item, boxes in detected:
+            width, height = image_size(item)
+            pending_cache[item[3]] = (width, height, boxes, item[4])
+        results.extend((item, pending_cache[item[3]][2]) for item in misses if item[3] in pending_cache)
+
+    cache_stats["hits"] += len(batch) - len(unique_misses) - phash_hits
+    cache_stats["phash_hits"] += phash_hits
+    cache_stats["misses"] += len(unique_misses)
+
+    detections = []
+    processed = []
+    for ((message_id, channel_name, _), *_), boxes in results:
+        kept = [box for box in boxes if box[1] >= min_confidence]
+        processed.append((message_id, channel_name, len(kept)))
+        for product_label, confidence, x, y, width, height in kept:
+            detections.append((
+                message_id,
+                channel_name,
+                product_label,
+                confidence,
+                x,
+                y,
+                width,
+                height
+            ))
+    return detections, processed
+
+
+def reset_model_results(cur, model_name):
+    """Delete a model's detections and ledger entries so every image is processed again.
+
+    Deleted detections are recorded in raw.image_detection_deletions.
+    """
+    cur.execute("""
+        WITH deleted AS (
+            DELETE FROM raw.image_detections WHERE model_name = %s
+            RETURNING detection_id, message_id, channel_name
+        )
+        INSERT INTO raw.image_detection_deletions (detection_id, message_id, channel_name)
+        SELECT detection_id, message_id, channel_name FROM deleted
+    """, (model_name,))
+    deleted = cur.rowcount
+    cur.execute("DELETE FROM raw.image_detection_runs WHERE model_name = %s", (model_name,))
+    ledger_deleted = cur.rowcount
+    cur.execute("DELETE FROM raw.image_detection_cache WHERE model_name = %s", (model_name,))
+    logger.info(
+        f"Reprocessing with {model_name}: removed {deleted} detections, {ledger_deleted} ledger entries "
+        f"and {cur.rowcount} cached results")
+
+
+def prune_deletion_log(cur, days=DELETION_LOG_DAYS):
+    """Forget deletions recorded more than ``days`` days ago."""
+    cur.execute(
+        "DELETE FROM raw.image_detection_deletions WHERE deleted_at < clock_timestamp() - make_interval(days => %s)",
+        (days,))
+    return cur.rowcount
+
+
+def replace_previous_results(cur, processed, model_name):
+    """Delete detections and ledger entries of other models and versions for the processed images.
+
+    Each image then keeps one set of detections, so the marts do not count
+    it once per model. Deleted detections are recorded in
+    raw.image_detection_deletions. Returns the number of detections deleted.
+    """
+    keys = ([message_id for message_id, _, _ in processed], [channel_name for _, channel_name, _ in processed])
+    cur.execute("""
+        WITH deleted AS (
+            DELETE FROM raw.image_detections d
+            USING UNNEST(%s::BIGINT[], %s::TEXT[]) AS i (message_id, channel_name)
+            WHERE d.channel_name = i.channel_name AND d.message_id = i.message_id
+              AND (d.model_name IS DISTINCT FROM %s OR d.model_version IS DISTINCT FROM %s)
+            RETURNING d.detection_id, d.message_id, d.channel_name
+        )
+        INSERT INTO raw.image_detection_deletions (detection_id, message_id, channel_name)
+        SELECT detection_id, message_id, channel_name FROM deleted
+    """, (*keys, model_name, MODEL_VERSION))
+    replaced = cur.rowcount
+    cur.execute("""
+        DELETE FROM raw.image_detection_runs r
+        USING UNNEST(%s::BIGINT[], %s::TEXT[]) AS i (message_id, channel_name)
+        WHERE r.channel_name = i.channel_name AND r.message_id = i.message_id
+          AND (r.model_name, r.model_version) <> (%s, %s)
+    """, (*keys, model_name, MODEL_VERSION))
+    return replaced
+
+
+def write_results(cur, detections, processed, model_name, cache_entries=None, keep_previous=False):
+    """Insert detections, record the processed images in the ledger and cache new results.
+
+    Unless ``keep_previous`` is set, the images' results from other models
+    and versions are replaced.
+    """
+    if processed and not keep_previous:
+        replace_previous_results(cur, processed, model_name)
+
+    if detections:
+        # Bulk insert detections, with labels replaced by their ids
+        ids = label_ids(cur, (detection[2] for detection in detections))
+        execute_values(
+            cur,
+            """
+            INSERT INTO raw.image_detections (message_id, channel_name, label_id, confidence, x, y, width, height, model_name, model_version) VALUES %s
+            """,
+            [(message_id, channel_name, ids[label], *values, model_name, MODEL_VERSION)
+             for message_id, channel_name, label, *values in detections]
+        )
+
+    # Record every processed image, including those without detections
+    execute_values(
+        cur,
+        """
+        INSERT INTO raw.image_detection_runs (message_id, channel_name, detection_count, model_name, model_version) VALUES %s
+        ON CONFLICT (channel_name, message_id, model_name, model_version)
+        DO UPDATE SET detection_count = EXCLUDED.detection_count, processed_at = CURRENT_TIMESTAMP
+        """,
+        [(message_id, channel_name, count, model_name, MODEL_VERSION)
+         for message_id, channel_name, count in processed]
+    )
+
+    if cache_entries:
+        execute_values(
+            cur,
+            """
+            INSERT INTO raw.image_detection_cache (file_hash, phash, image_width, image_height, detections, model_name, model_version) VALUES %s
+            ON CONFLICT (file_hash, model_name, model_version) DO NOTHING
+            """,
+            [(file_hash, phash, width, height, json.dumps(boxes), model_name, MODEL_VERSION)
+             for file_hash, (width, height, boxes, phash) in cache_entries.items()]
+        )
+
+
+def enrich_images_with_yolo(batch_size=BATCH_SIZE, workers=DECODE_WORKERS,
+                            model_name=MODEL_NAME, reprocess=False, commit_images=COMMIT_IMAGES,
+                            with_phash=False, retention_months=None, channels=None,
+                            start_date=None, end_date=None, export_format=EXPORT_FORMAT,
+                            min_confidence=MIN_CONFIDENCE, keep_previous=False):
+    """Run YOLOv8 on images not yet processed by the model and store detections in PostgreSQL.
+
+    Candidates are streamed from a server-side cursor on one connection
+    while results are written on another and committed every
+    ``commit_images`` images, so memory stays flat and a crashed run
+    resumes where it stopped: images already recorded in
+    raw.image_detection_runs for this model name and version are skipped.
+    With ``reprocess`` the model's earlier results are deleted first so
+    every image is processed again. Results of other models or versions
+    for the images processed are replaced, unless ``keep_previous`` is set
+    (the marts then count each image once per model).
+
+    Images whose file hash (or, with ``with_phash``, perceptual hash) is
+    in raw.image_detection_cache reuse the cached detections instead of
+    running the model. Only boxes with at least ``min_confidence`` are
+    stored.
+
+    With ``retention_months``, detection partitions older than that many
+    full months are dropped before enriching. ``channels`` and the
+    ``start_date``..``end_date`` message date range (end exclusive) limit
+    the images considered.
+
+    The model comes from the process-wide registry, so repeated calls in one
+    process load it once; ``export_format`` "onnx" or "openvino" runs an
+    exported copy of the weights instead.
+
+    Returns a summary dict with image, detection and cache hit counts.
+    """
+    configure_logging(logger, 'yolo_enrichment.log')
+    try:
+        # Connect to PostgreSQL: one connection streams candidates, the other writes
         conn = psycopg2.connect(**db_params)
         create_image_detections_table(conn)
+        detector = get_model(model_name, export_format)
+
+        if retention_months is not None:
+            with conn.cursor() as cur:
+                dropped = drop_partitions_before(
+                    cur, "raw.image_detections", retention_cutoff(retention_months))
+            conn.commit()
+            if dropped:
+                logger.info(f"Dropped {len(dropped)} detection partitions past retention: {', '.join(dropped)}")
 
         with conn.cursor() as cur:
-            # Query messages with images
-            cur.execute("""
-                SELECT message_id, channel_name, media_path
-                FROM raw.telegram_messages
-                WHERE has_media = true AND media_type = 'photo' AND media_path IS NOT NULL;
-            """)
-            image_records = cur.fetchall()
+            prune_deletion_log(cur)
+            if reprocess:
+                reset_model_results(cur, model_name)
+        conn.commit()
+
+        read_conn = psycopg2.connect(**db_params)
+        read_conn.set_session(readonly=True)
+
+        with read_conn.cursor(name="yolo_candidates") as read_cur, conn.cursor() as cur:
+            read_cur.itersize = FETCH_SIZE
 
-            if not image_records:
-                logger.warning("No images found in raw.telegram_messages")
-                conn.close()
-                return
+            # Query messages with images the model has not processed yet
+            scope, params = "", [model_name, MODEL_VERSION]
+            if channels:
+                scope += " AND m.channel_name = ANY(%s)"
+                params.append(list(channels))
+            if start_date:
+                scope += " AND m.date >= %s"
+                params.append(start_date)
+            if end_date:
+                scope += " AND m.date < %s"
+                params.append(end_date)
+            read_cur.execute(f"""
+                SELECT m.message_id, m.channel_name, m.media_path
+                FROM raw.telegram_messages m
+                WHERE m.has_media = true AND m.media_type = 'photo' AND m.media_path IS NOT NULL
+                  AND NOT EXISTS (
+                      SELECT 1 FROM raw.image_detection_runs r
+                      WHERE r.channel_name = m.channel_name
+                        AND r.message_id = m.message_id
+                        AND r.model_name = %s
+                        AND r.model_version = %s
+                  ){scope};
+            """, params)
 
             detections = []
-            for message_id, channel_name, media_path in image_records:
-                if not Path(media_path).exists():
-                    logger.warning(f"Image not found: {media_path}")
-                    continue
-
-                try:
-                    # Run YOLOv8 inference
-                    results = model(media_path)
-                    for result in results:
-                        for box in result.boxes:
-                            product_label = result.names[int(box.cls)]
-                            confidence = float(box.conf)
-                            bbox = {
-                                'x': float(box.xyxy[0][0]),
-                                'y': float(box.xyxy[0][1]),
-                                'width': float(box.xyxy[0][2] - box.xyxy[0][0]),
-                                'height': float(box.xyxy[0][3] - box.xyxy[0][1])
-                            }
-                            detections.append((
-                                message_id,
-                                channel_name,
-                                product_label,
-                                confidence,
-                                json.dumps(bbox)
-                            ))
-                            logger.info(f"Detected {product_label} in {media_path} with confidence {confidence}")
-                except Exception as e:
-                    logger.error(
-                        f"Failed to process image {media_path}: {str(e)}")
-                    continue
-
-            if detections:
-                # Bulk insert detections
-                execute_values(
-                    cur,
-                    """
-                    INSERT INTO raw.image_detections (message_id, channel_name, product_label, confidence, bounding_box) VALUES %s
-                    """,
-                    detections
-                )
-                conn.commit()
-                logger.info(
-                    f"Inserted {len(detections)} detections into raw.image_detections")
+            processed = []
+            pending_cache = {}
+            totals = {"images": 0, "detections": 0}
+            cache_stats = {"hits": 0, "phash_hits": 0, "misses": 0}
+            started = time.monotonic()
+
+            progress = ProgressLog(logger, f"Enriching with {model_name}", "images")
+
+            def flush():
+                with timed(DB_WRITE_SECONDS, stage="enrich"):
+                    write_results(cur, detections, processed, model_name, pending_cache, keep_previous)
+                    conn.commit()
+                totals["images"] += len(processed)
+                totals["detections"] += len(detections)
+                IMAGES_PROCESSED.labels(model=model_name).inc(len(processed))
+                DETECTIONS_WRITTEN.labels(model=model_name).inc(len(detections))
+                progress.add(len(processed))
+                logger.debug(
+                    f"Committed {len(detections)} detections for {len(processed)} images "
+                    f"({totals['images']} images so far)")
+                detections.clear()
+                processed.clear()
+                pending_cache.clear()
+
+            for batch in iter_image_batches(read_cur, batch_size, workers, with_phash):
+                batch_detections, batch_processed = process_batch(
+                    cur, detector, batch, model_name, with_phash, pending_cache, cache_stats,
+                    min_confidence)
+                detections.extend(batch_detections)
+                processed.extend(batch_processed)
+                if len(processed) >= commit_images:
+                    flush()
+
+            if processed:
+                flush()
+
+            elapsed = time.monotonic() - started
+            STAGE_SECONDS.labels(stage="enrich").observe(elapsed)
+            THROUGHPUT.labels(stage="enrich").set(totals["images"] / elapsed if elapsed else 0.0)
+            for result, count in cache_stats.items():
+                CACHE_LOOKUPS.labels(result=result).inc(count)
+            if not totals["images"]:
+                logger.info(f"No new images to process with {model_name}")
             else:
-                logger.warning("No detections to insert")
+                logger.info(
+                    f"Processed {totals['images']} images in {elapsed:.1f}s "
+                    f"({totals['images'] / elapsed if elapsed else 0.0:.1f} images/s, batch size {batch_size}, "
+                    f"{workers} decode workers); inserted {totals['detections']} detections")
+                looked_up = sum(cache_stats.values())
+                hit_rate = (cache_stats["hits"] + cache_stats["phash_hits"]) / looked_up if looked_up else 0.0
+                logger.info(
+                    f"Detection cache: {cache_stats['hits']} exact hits, {cache_stats['phash_hits']} "
+                    f"near-duplicate hits, {cache_stats['misses']} misses ({hit_rate:.1%} hit rate)")
 
+        read_conn.close()
         conn.close()
         logger.info("Finished YOLO enrichment")
+        return {**totals, **cache_stats, "elapsed_seconds": elapsed,
+                "images_per_second": totals["images"] / elapsed if elapsed else 0.0}
 
     except Exception as e:
         logger.error(f"Error during YOLO enrichment: {str(e)}")
+        # Label ids added in the rolled back transaction no longer exist
+        _label_ids.clear()
+        if 'read_conn' in locals():
+            read_conn.close()
         if 'conn' in locals():
             conn.rollback()
             conn.close()
@@ -140,4 +746,32 @@ def enrich_images_with_yolo():
 
 
 if __name__ == "__main__":
-    enrich_images_with_yolo()
+    parser = argparse.ArgumentParser(description="Detect products in scraped images with YOLOv8.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="Images passed to the model per inference call")
+    parser.add_argument("--workers", type=int, default=DECODE_WORKERS,
+                        help="Threads decoding images ahead of inference")
+    parser.add_argument("--model", default=MODEL_NAME,
+                        help="YOLO weights to run (default: %(default)s)")
+    parser.add_argument("--export-format", choices=EXPORT_FORMATS, default=EXPORT_FORMAT,
+                        help="Run the weights as they are or an ONNX/OpenVINO export of them")
+    parser.add_argument("--reprocess", action="store_true",
+                        help="Delete the model's earlier detections and process every image again")
+    parser.add_argument("--commit-images", type=int, default=COMMIT_IMAGES,
+                        help="Write and commit detections after this many processed images")
+    parser.add_argument("--phash", action="store_true",
+                        help="Also reuse cached detections for near-duplicate images")
+    parser.add_argument("--keep-previous", action="store_true",
+                        help="Keep other models' and versions' detections for the images processed")
+    parser.add_argument("--min-confidence", type=float, default=MIN_CONFIDENCE,
+                        help="Store only boxes with at least this confidence (default: %(default)s)")
+    parser.add_argument("--retention-months", type=int, default=None,
+                        help="Drop detection partitions older than this many full months")
+    args = parser.parse_args()
+
+    enrich_images_with_yolo(batch_size=args.batch_size, workers=args.workers,
+                            model_name=args.model, reprocess=args.reprocess,
+                            commit_images=args.commit_images, with_phash=args.phash,
+                            retention_months=args.retention_months,
+                            export_format=args.export_format, min_confidence=args.min_confidence,
+                            keep_previous=args.keep_previous)
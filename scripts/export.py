@@ -0,0 +1,133 @@
+import io
+import csv
+import json
+from datetime import date, datetime
+from sqlalchemy import text
+from scripts.database import async_engine
+from scripts.crud import messages_query, detections_query
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow is only needed for Arrow IPC exports
+    pa = None
+
+# Rows fetched from the server-side cursor per chunk of output
+EXPORT_CHUNK_ROWS = 5000
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+# Query builder and Arrow column types for each exportable dataset
+EXPORT_DATASETS = {
+    "messages": (messages_query, [
+        ("date", "date32"),
+        ("message_id", "int64"),
+        ("channel_id", "int64"),
+        ("channel_name", "string"),
+        ("message_text", "string"),
+        ("has_media", "bool_"),
+        ("media_type", "string"),
+        ("media_path", "string"),
+        ("detected_labels", "string"),
+        ("top_label", "string"),
+        ("max_confidence", "float64"),
+        ("detection_count", "int64"),
+    ]),
+    "detections": (detections_query, [
+        ("detection_id", "int64"),
+        ("message_id", "int64"),
+        ("channel_name", "string"),
+        ("product_label", "string"),
+        ("confidence", "float32"),
+        ("x", "float32"),
+        ("y", "float32"),
+        ("width", "float32"),
+        ("height", "float32"),
+        ("model_name", "string"),
+        ("model_version", "string"),
+        ("detection_timestamp", "timestamp_us_utc"),
+    ]),
+}
+
+
+def arrow_available():
+    """Return True if Arrow IPC exports are supported on this server."""
+    return pa is not None
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def _flat(value):
+    """Serialize nested values (e.g. detected label lists) as JSON text for CSV and Arrow."""
+    return json.dumps(value) if isinstance(value, (dict, list)) else value
+
+
+def _arrow_schema(columns):
+    types = {
+        "date32": pa.date32(),
+        "int64": pa.int64(),
+        "string": pa.string(),
+        "bool_": pa.bool_(),
+        "float32": pa.float32(),
+        "float64": pa.float64(),
+        "timestamp_us_utc": pa.timestamp("us", tz="UTC"),
+    }
+    return pa.schema([(name, types[type_name]) for name, type_name in columns])
+
+
+async def _row_batches(query, params):
+    """Yield lists of row mappings from a server-side cursor."""
+    async with async_engine.connect() as conn:
+        # Exports can run far longer than the API's statement timeout
+        await conn.execute(text("SET LOCAL statement_timeout = 0"))
+        result = await conn.stream(query, params)
+        async for rows in result.mappings().partitions(EXPORT_CHUNK_ROWS):
+            yield rows
+
+
+async def _ndjson(batches, columns):
+    async for rows in batches:
+        yield "".join(json.dumps(dict(row), default=_json_default) + "\n" for row in rows).encode("utf-8")
+
+
+async def _csv(batches, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    async for rows in batches:
+        writer.writerows([_flat(row[name]) for name, _ in columns] for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def _arrow(batches, columns):
+    schema = _arrow_schema(columns)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        async for rows in batches:
+            writer.write_batch(pa.RecordBatch.from_pylist(
+                [{name: _flat(row[name]) for name, _ in columns} for row in rows], schema=schema))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    # End-of-stream marker written when the writer closes
+    yield sink.getvalue()
+
+
+def export_dataset(dataset, export_format, channel_name=None, start_date=None, end_date=None):
+    """Return an async iterator of encoded chunks for a dataset export."""
+    build_query, columns = EXPORT_DATASETS[dataset]
+    query, params = build_query(channel_name, start_date, end_date)
+    batches = _row_batches(query, params)
+    encoders = {"ndjson": _ndjson, "csv": _csv, "arrow": _arrow}
+    return encoders[export_format](batches, columns)
@@ -1,27 +1,26 @@
 import os
 import json
+import hashlib
 import logging
+import argparse
+import time
 import psycopg2
-from psycopg2.extras import execute_values
-from dotenv import load_dotenv
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from datetime import date
 
-# Configure logging to file and console
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-
-file_handler = logging.FileHandler('logs/load_raw.log')
-file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+from scripts.logging_config import configure_logging
+from scripts.metrics import ROWS_LOADED, STAGE_SECONDS, DB_WRITE_SECONDS, THROUGHPUT, ProgressLog, timed
+from scripts.partitions import (set_aside_unpartitioned, ensure_partitions, migrate_rows,
+                                drop_partitions_before, retention_cutoff, month_start, upcoming_months)
 
-logger.handlers = []
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
 
-# Load environment variables
-load_dotenv()
+# Handlers are attached by configure_logging() when loading starts
+logger = logging.getLogger(__name__)
 
 # PostgreSQL connection parameters
 db_params = {
@@ -32,27 +31,68 @@ db_params = {
     'port': os.getenv('POSTGRES_PORT')
 }
 
-# Data lake path
-DATA_LAKE_PATH = "../data/raw/telegram_messages"
+# Data lake path, by default under the repository root
+DATA_LAKE_PATH = os.getenv("DATA_LAKE_PATH",
+                           str(Path(__file__).resolve().parents[1] / "data" / "raw" / "telegram_messages"))
+
+# Columns filled by COPY, in the order rows are generated
+COPY_COLUMNS = ("message_id", "channel_name", "date", "text", "has_media", "media_type", "media_path", "raw_data")
+
+# Bytes requested per read by psycopg2's copy_expert
+COPY_BUFFER_SIZE = 64 * 1024
+
+# Session-local table each file is copied into before being upserted
+STAGING_TABLE = "telegram_messages_staging"
+
+# Number of worker processes, each with its own connection
+LOAD_WORKERS = int(os.getenv("LOAD_WORKERS", "4"))
+
+# Commit once this many rows have been loaded since the last commit
+COMMIT_ROWS = int(os.getenv("LOAD_COMMIT_ROWS", "50000"))
 
 
 def create_raw_table(conn):
-    """Create the raw.telegram_messages table if it doesn't exist."""
+    """Create the raw.telegram_messages table if it doesn't exist.
+
+    The table is range-partitioned by month on the message date. A plain
+    table left by an earlier version is migrated into the partitioned one.
+    """
     try:
         with conn.cursor() as cur:
+            cur.execute("CREATE SCHEMA IF NOT EXISTS raw")
+            legacy_table = set_aside_unpartitioned(cur, "raw.telegram_messages")
             cur.execute("""
-                CREATE SCHEMA IF NOT EXISTS raw;
                 CREATE TABLE IF NOT EXISTS raw.telegram_messages (
-                    message_id BIGINT,
-                    channel_name VARCHAR(255),
-                    date TIMESTAMP WITH TIME ZONE,
+                    message_id BIGINT NOT NULL,
+                    channel_name VARCHAR(255) NOT NULL,
+                    date TIMESTAMP WITH TIME ZONE NOT NULL,
                     text TEXT,
                     has_media BOOLEAN,
                     media_type VARCHAR(50),
                     media_path VARCHAR(512),
-                    raw_data JSONB
+                    raw_data JSONB,
+                    -- dbt's incremental models pick up rows changed since their last run
+                    loaded_at TIMESTAMP WITH TIME ZONE DEFAULT clock_timestamp(),
+                    PRIMARY KEY (channel_name, message_id, date)
+                ) PARTITION BY RANGE (date);
+                CREATE TABLE IF NOT EXISTS raw.telegram_messages_default
+                    PARTITION OF raw.telegram_messages DEFAULT;
+                CREATE INDEX IF NOT EXISTS telegram_messages_loaded_at_idx
+                    ON raw.telegram_messages (loaded_at);
+                CREATE TABLE IF NOT EXISTS raw.load_manifest (
+                    file_path TEXT PRIMARY KEY,
+                    file_size BIGINT NOT NULL,
+                    file_mtime DOUBLE PRECISION NOT NULL,
+                    content_hash CHAR(64) NOT NULL,
+                    row_count INTEGER NOT NULL,
+                    loaded_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
                 );
             """)
+            ensure_partitions(cur, "raw.telegram_messages", upcoming_months())
+
+            if legacy_table:
+                copied = migrate_rows(cur, legacy_table, "raw.telegram_messages")
+                logger.info(f"Migrated {copied} messages into the partitioned raw.telegram_messages table")
             conn.commit()
             logger.info("Created raw.telegram_messages table")
     except Exception as e:
@@ -61,65 +101,397 @@ def create_raw_table(conn):
         raise
 
 
-def load_json_to_postgres():
-    """Load JSON files from data lake into PostgreSQL."""
+def _parse_json(line):
+    """Parse one JSON line, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+def _copy_field(value):
+    """Encode a value as a field of PostgreSQL's COPY text format."""
+    if value is None:
+        return b"\\N"
+    if isinstance(value, bool):
+        return b"t" if value else b"f"
+    if not isinstance(value, bytes):
+        value = str(value).encode("utf-8")
+    return (value.replace(b"\\", b"\\\\")
+                 .replace(b"\t", b"\\t")
+                 .replace(b"\n", b"\\n")
+                 .replace(b"\r", b"\\r"))
+
+
+def iter_copy_rows(json_file, channel_name, stats):
+    """Yield COPY rows for a JSONL file, one line at a time.
+
+    The original line bytes are reused for ``raw_data`` instead of being
+    serialized again. Lines that are not valid JSON, or not a message object
+    with the expected keys, are skipped and counted in ``stats["skipped"]``.
+    """
+    with open(json_file, "rb") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                msg = _parse_json(line)
+            except ValueError as e:
+                logger.warning(f"Skipping invalid JSON at {json_file}:{line_number}: {str(e)}")
+                stats["skipped"] += 1
+                continue
+
+            try:
+                row = b"\t".join((
+                    _copy_field(msg['message_id']),
+                    _copy_field(channel_name),
+                    _copy_field(msg['date']),
+                    _copy_field(msg['text']),
+                    _copy_field(msg['has_media']),
+                    _copy_field(msg['media_type']),
+                    _copy_field(msg['media_path']),
+                    _copy_field(line),
+                )) + b"\n"
+            except (LookupError, TypeError) as e:
+                logger.warning(f"Skipping non-message JSON at {json_file}:{line_number}: {e!r}")
+                stats["skipped"] += 1
+                continue
+            yield row
+            stats["rows"] += 1
+
+
+class CopyStream:
+    """Read-only file-like object that feeds generated rows to ``copy_expert``.
+
+    Only as many rows as fit in the requested read size are pulled from the
+    generator, so memory stays constant regardless of the file size.
+    """
+
+    def __init__(self, rows):
+        self._rows = rows
+        self._buffer = bytearray()
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._buffer += row
+        if size < 0 or size >= len(self._buffer):
+            data = bytes(self._buffer)
+            self._buffer.clear()
+        else:
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+        return data
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+def copy_file(cur, json_file, channel_name, table="raw.telegram_messages"):
+    """Stream one JSONL file into ``table`` with COPY.
+
+    Returns a dict with the number of rows copied and lines skipped.
+    """
+    stats = {"rows": 0, "skipped": 0}
+    stream = CopyStream(iter_copy_rows(json_file, channel_name, stats))
+    cur.copy_expert(
+        f"COPY {table} ({', '.join(COPY_COLUMNS)}) FROM STDIN",
+        stream,
+        size=COPY_BUFFER_SIZE,
+    )
+    return stats
+
+
+def create_staging_table(cur):
+    """Create the session-local staging table files are copied into."""
+    cur.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE}
+            (LIKE raw.telegram_messages INCLUDING DEFAULTS);
+    """)
+
+
+def upsert_staged_messages(cur):
+    """Move staged rows into raw.telegram_messages and empty the staging table.
+
+    Duplicates within the staged rows collapse to one row per
+    (channel_name, message_id, date), preferring rows that carry a media path.
+    Existing rows are only rewritten when their raw data changed, and
+    rewritten rows get a fresh ``loaded_at`` so dbt reprocesses them. The
+    stamp is the statement's wall-clock time, not the transaction start, so
+    it trails the commit by one chunk at most (see load_lookback_minutes).
+
+    Returns the number of rows inserted or updated.
+    """
+    columns = ", ".join(COPY_COLUMNS)
+    updates = ", ".join(
+        f"{column} = EXCLUDED.{column}"
+        for column in COPY_COLUMNS if column not in ("channel_name", "message_id", "date")
+    )
+    cur.execute(f"""
+        INSERT INTO raw.telegram_messages ({columns}, loaded_at)
+        SELECT DISTINCT ON (channel_name, message_id, date) {columns}, clock_timestamp()
+        FROM {STAGING_TABLE}
+        ORDER BY channel_name, message_id, date, media_path IS NULL
+        ON CONFLICT (channel_name, message_id, date) DO UPDATE SET {updates},
+            loaded_at = clock_timestamp()
+        WHERE raw.telegram_messages.raw_data IS DISTINCT FROM EXCLUDED.raw_data;
+    """)
+    upserted = cur.rowcount
+    cur.execute(f"TRUNCATE {STAGING_TABLE}")
+    return upserted
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fetch_manifest(cur):
+    """Return the load manifest as {file_path: (size, mtime, content_hash)}."""
+    cur.execute("SELECT file_path, file_size, file_mtime, content_hash FROM raw.load_manifest")
+    return {row[0]: (row[1], row[2], row[3]) for row in cur.fetchall()}
+
+
+def record_manifest(cur, file_path, file_size, file_mtime, content_hash, row_count):
+    """Insert or refresh a file's load manifest entry."""
+    cur.execute("""
+        INSERT INTO raw.load_manifest (file_path, file_size, file_mtime, content_hash, row_count, loaded_at)
+        VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (file_path) DO UPDATE SET
+            file_size = EXCLUDED.file_size,
+            file_mtime = EXCLUDED.file_mtime,
+            content_hash = EXCLUDED.content_hash,
+            row_count = EXCLUDED.row_count,
+            loaded_at = EXCLUDED.loaded_at;
+    """, (file_path, file_size, file_mtime, content_hash, row_count))
+
+
+def check_manifest(cur, manifest, json_file):
+    """Decide whether a file needs loading.
+
+    Size and mtime are compared first; the content hash is only computed
+    when they differ. A touched but unchanged file gets its manifest entry
+    refreshed and is skipped.
+
+    Returns None to skip the file, otherwise the (key, size, mtime, hash)
+    to record once it is loaded.
+    """
+    key = json_file.relative_to(DATA_LAKE_PATH).as_posix()
+    st = json_file.stat()
+    entry = manifest.get(key)
+    if entry and entry[0] == st.st_size and entry[1] == st.st_mtime:
+        return None
+
+    content_hash = hash_file(json_file)
+    if entry and entry[2] == content_hash:
+        cur.execute(
+            "UPDATE raw.load_manifest SET file_size = %s, file_mtime = %s WHERE file_path = %s",
+            (st.st_size, st.st_mtime, key),
+        )
+        return None
+    return key, st.st_size, st.st_mtime, content_hash
+
+
+def discover_files(channels=None, days=None):
+    """Return (channel_name, path, size) for every JSON file in the data lake.
+
+    ``channels`` and ``days`` (YYYY-MM-DD strings) limit the files returned.
+    """
+    files = []
+    for channel_dir in Path(DATA_LAKE_PATH).iterdir():
+        if not channel_dir.is_dir() or (channels and channel_dir.name not in channels):
+            continue
+        for json_file in channel_dir.glob("*.json"):
+            if days and json_file.stem not in days:
+                continue
+            files.append((channel_dir.name, json_file, json_file.stat().st_size))
+    return files
+
+
+def file_months(files):
+    """Return the months covered by data lake files, which are named by message day."""
+    months = set()
+    for _, json_file, _ in files:
+        try:
+            months.add(month_start(date.fromisoformat(json_file.stem)))
+        except ValueError:
+            continue
+    return months
+
+
+def apply_retention(conn, retention_months):
+    """Drop message partitions older than ``retention_months`` full months."""
+    with conn.cursor() as cur:
+        dropped = drop_partitions_before(cur, "raw.telegram_messages", retention_cutoff(retention_months))
+    conn.commit()
+    if dropped:
+        logger.info(f"Dropped {len(dropped)} message partitions past retention: {', '.join(dropped)}")
+    return dropped
+
+
+def assign_files(files, workers):
+    """Spread files over ``workers`` buckets, largest first, balancing total bytes."""
+    buckets = [[] for _ in range(workers)]
+    loads = [0] * workers
+    for channel_name, json_file, size in sorted(files, key=lambda f: f[2], reverse=True):
+        target = loads.index(min(loads))
+        buckets[target].append((channel_name, json_file))
+        loads[target] += size
+    return buckets
+
+
+def load_files(worker_id, files, manifest, commit_rows=COMMIT_ROWS):
+    """Load a list of (channel_name, path) files on a dedicated connection.
+
+    Runs inside a worker process. Rows are committed once ``commit_rows``
+    have accumulated, together with the manifest entries of the files they
+    came from, so a failure never leaves the manifest ahead of the data.
+
+    Returns a summary dict for the worker.
+    """
+    summary = {"worker": worker_id, "files": 0, "skipped_files": 0, "rows": 0, "upserted": 0}
+    started = time.monotonic()
+    conn = psycopg2.connect(**db_params)
+    try:
+        with conn.cursor() as cur:
+            create_staging_table(cur)
+            pending_rows = 0
+            progress = ProgressLog(logger, f"[worker {worker_id}] Loading", "rows")
+
+            for channel_name, json_file in files:
+                file_started = time.monotonic()
+                fingerprint = check_manifest(cur, manifest, json_file)
+                if fingerprint is None:
+                    summary["skipped_files"] += 1
+                    continue
+
+                logger.debug(f"[worker {worker_id}] Loading file: {json_file}")
+                with timed(DB_WRITE_SECONDS, stage="load"):
+                    stats = copy_file(cur, json_file, channel_name, STAGING_TABLE)
+                    upserted = upsert_staged_messages(cur)
+                    record_manifest(cur, *fingerprint, stats["rows"])
+                STAGE_SECONDS.labels(stage="load_file").observe(time.monotonic() - file_started)
+                ROWS_LOADED.labels(channel=channel_name).inc(stats["rows"])
+                progress.add(stats["rows"])
+
+                if not stats["rows"]:
+                    logger.warning(f"No data in {json_file}")
+                summary["files"] += 1
+                summary["rows"] += stats["rows"]
+                summary["upserted"] += upserted
+
+                pending_rows += stats["rows"]
+                if pending_rows >= commit_rows:
+                    with timed(DB_WRITE_SECONDS, stage="load_commit"):
+                        conn.commit()
+                    pending_rows = 0
+
+            with timed(DB_WRITE_SECONDS, stage="load_commit"):
+                conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    elapsed = time.monotonic() - started
+    summary["elapsed_seconds"] = elapsed
+    summary["rows_per_second"] = summary["rows"] / elapsed if elapsed else 0.0
+    logger.info(
+        f"[worker {worker_id}] Loaded {summary['rows']} messages from {summary['files']} files "
+        f"in {elapsed:.1f}s ({summary['rows_per_second']:.0f} rows/s, "
+        f"{summary['skipped_files']} unchanged files skipped)")
+    return summary
+
+
+def load_json_to_postgres(force=False, workers=LOAD_WORKERS, commit_rows=COMMIT_ROWS,
+                          retention_months=None, channels=None, days=None):
+    """Load new or changed JSON files from data lake into PostgreSQL.
+
+    Files are spread over ``workers`` processes, each with its own
+    connection; with one worker everything runs in this process. Files
+    whose size, mtime or content hash match the load manifest are skipped
+    unless ``force`` is set. ``channels`` and ``days`` limit the load to
+    those channels' directories and day files.
+
+    Monthly partitions for every month in the data lake are created before
+    the workers start. With ``retention_months``, partitions older than that
+    many full months are dropped afterwards.
+
+    Returns the per-worker summaries.
+    """
+    configure_logging(logger, 'load_raw.log')
     try:
         # Connect to PostgreSQL
         conn = psycopg2.connect(**db_params)
         create_raw_table(conn)
 
+        started = time.monotonic()
+        files = discover_files(channels, days)
+
         with conn.cursor() as cur:
-            for channel_dir in Path(DATA_LAKE_PATH).iterdir():
-                if not channel_dir.is_dir():
-                    continue
-                channel_name = channel_dir.name
-                logger.info(f"Processing channel: {channel_name}")
-
-                for json_file in channel_dir.glob("*.json"):
-                    logger.info(f"Loading file: {json_file}")
-                    with open(json_file, 'r', encoding='utf-8') as f:
-                        messages = [json.loads(line) for line in f if line.strip()]
-
-                    if not messages:
-                        logger.warning(f"No data in {json_file}")
-                        continue
-
-                    # Prepare data for bulk insert
-                    values = [
-                        (
-                            msg['message_id'],
-                            channel_name,
-                            msg['date'],
-                            msg['text'],
-                            msg['has_media'],
-                            msg['media_type'],
-                            msg['media_path'],
-                            json.dumps(msg)
-                        )
-                        for msg in messages
-                    ]
-
-                    # Bulk insert
-                    execute_values(
-                        cur,
-                        """
-                        INSERT INTO raw.telegram_messages (message_id, channel_name, date, text, has_media, media_type, media_path, raw_data) VALUES %s
-                        """,
-                        values
-                    )
-                    conn.commit()
-                    logger.info(f"Loaded {len(values)} messages from {json_file}")
+            manifest = {} if force else fetch_manifest(cur)
+            # Created up front so workers never run partition DDL concurrently
+            created = ensure_partitions(cur, "raw.telegram_messages", file_months(files))
+        conn.commit()
+        if created:
+            logger.info(f"Created {len(created)} message partitions")
+        workers = max(1, min(workers, len(files)))
+        buckets = assign_files(files, workers)
 
+        def manifest_for(bucket):
+            keys = {json_file.relative_to(DATA_LAKE_PATH).as_posix() for _, json_file in bucket}
+            return {key: manifest[key] for key in keys if key in manifest}
+
+        if workers == 1:
+            summaries = [load_files(0, buckets[0], manifest_for(buckets[0]), commit_rows)]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(load_files, worker_id, bucket, manifest_for(bucket), commit_rows)
+                    for worker_id, bucket in enumerate(buckets)
+                ]
+                summaries = [future.result() for future in futures]
+
+        elapsed = time.monotonic() - started
+        total_rows = sum(summary["rows"] for summary in summaries)
+        THROUGHPUT.labels(stage="load").set(total_rows / elapsed if elapsed else 0.0)
+        logger.info(
+            f"Finished loading data to PostgreSQL: {total_rows} messages from "
+            f"{sum(summary['files'] for summary in summaries)} files in {elapsed:.1f}s "
+            f"with {workers} workers ({total_rows / elapsed if elapsed else 0.0:.0f} rows/s, "
+            f"{sum(summary['skipped_files'] for summary in summaries)} unchanged files skipped)")
+
+        if retention_months is not None:
+            apply_retention(conn, retention_months)
         conn.close()
-        logger.info("Finished loading data to PostgreSQL")
+        return summaries
 
     except Exception as e:
         logger.error(f"Error loading data to PostgreSQL: {str(e)}")
-        if 'conn' in locals():
+        if 'conn' in locals() and not conn.closed:
             conn.rollback()
             conn.close()
         raise
 
 
 if __name__ == "__main__":
-    load_json_to_postgres()
+    parser = argparse.ArgumentParser(description="Load the Telegram data lake into PostgreSQL.")
+    parser.add_argument("--force", action="store_true",
+                        help="Reload every file, ignoring the load manifest")
+    parser.add_argument("--workers", type=int, default=LOAD_WORKERS,
+                        help="Number of worker processes, each with its own connection")
+    parser.add_argument("--commit-rows", type=int, default=COMMIT_ROWS,
+                        help="Commit after this many rows per worker")
+    parser.add_argument("--retention-months", type=int, default=None,
+                        help="Drop message partitions older than this many full months")
+    args = parser.parse_args()
+
+    load_json_to_postgres(force=args.force, workers=args.workers, commit_rows=args.commit_rows,
+                          retention_months=args.retention_months)
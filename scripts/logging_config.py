@@ -0,0 +1,40 @@
+"""Logging for the pipeline scripts, set up on first use rather than at import.
+
+Importing a script (from Dagster, the benchmarks or a test) leaves logging
+alone; its entry points call ``configure_logging`` before doing any work.
+"""
+import os
+import logging
+import threading
+from pathlib import Path
+
+FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_configured = set()
+_lock = threading.Lock()
+
+
+def configure_logging(logger, filename, level=logging.INFO):
+    """Send ``logger``'s records to ``filename`` under LOG_DIR and to the console.
+
+    LOG_DIR (default ``scripts/logs``) is created if it is missing. Calling it
+    again for a logger that is already configured does nothing.
+    """
+    with _lock:
+        if logger.name in _configured:
+            return logger
+        log_dir = Path(os.getenv("LOG_DIR", Path(__file__).resolve().parent / "logs"))
+        log_dir.mkdir(parents=True, exist_ok=True)
+
+        file_handler = logging.FileHandler(log_dir / filename)
+        file_handler.setFormatter(logging.Formatter(FORMAT))
+
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(FORMAT))
+
+        logger.handlers = []
+        logger.addHandler(file_handler)
+        logger.addHandler(console_handler)
+        logger.setLevel(level)
+        _configured.add(logger.name)
+    return logger
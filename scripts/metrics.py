@@ -0,0 +1,87 @@
+"""Prometheus metrics shared by the pipeline stages and the API.
+
+Every process (loader workers, Dagster steps, the API) records into the
+default registry. Point PROMETHEUS_MULTIPROC_DIR at a directory shared by
+all of them, before they start, and the API's /metrics route reports the
+pipeline's metrics alongside its own.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest, multiprocess)
+
+# Seconds between sampled progress lines in place of per-item logging
+PROGRESS_LOG_SECONDS = float(os.getenv("PROGRESS_LOG_SECONDS", "30"))
+
+MESSAGES_SCRAPED = Counter(
+    "pipeline_messages_scraped_total", "Messages written to the data lake", ["channel"])
+BYTES_DOWNLOADED = Counter(
+    "pipeline_bytes_downloaded_total", "Bytes of JSON lines and photos written by the scraper",
+    ["channel"])
+ROWS_LOADED = Counter(
+    "pipeline_rows_loaded_total", "Rows copied into raw.telegram_messages", ["channel"])
+IMAGES_PROCESSED = Counter(
+    "pipeline_images_processed_total", "Images enriched, from the model or the detection cache",
+    ["model"])
+DETECTIONS_WRITTEN = Counter(
+    "pipeline_detections_written_total", "Detections inserted into raw.image_detections", ["model"])
+CACHE_LOOKUPS = Counter(
+    "pipeline_detection_cache_lookups_total", "Detection cache lookups by result", ["result"])
+
+STAGE_SECONDS = Histogram(
+    "pipeline_stage_duration_seconds", "Wall time of one unit of a stage's work", ["stage"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600))
+INFERENCE_SECONDS = Histogram(
+    "pipeline_inference_seconds", "Model inference time per batch", ["model"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+DB_WRITE_SECONDS = Histogram(
+    "pipeline_db_write_seconds", "Time spent writing one batch to PostgreSQL", ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+API_REQUEST_SECONDS = Histogram(
+    "api_request_duration_seconds", "API request latency", ["method", "route", "status"])
+
+THROUGHPUT = Gauge(
+    "pipeline_throughput_per_second", "Items per second of a stage's most recent run",
+    ["stage"], multiprocess_mode="mostrecent")
+
+
+@contextmanager
+def timed(histogram, **labels):
+    """Observe the wall time of the ``with`` block in ``histogram``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - started)
+
+
+def metrics_payload():
+    """Return (body, content type) of the metrics exposition for /metrics."""
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class ProgressLog:
+    """Log a running count at most every ``interval`` seconds instead of one line per item."""
+
+    def __init__(self, logger, label, unit, interval=PROGRESS_LOG_SECONDS):
+        self.logger = logger
+        self.label = label
+        self.unit = unit
+        self.interval = interval
+        self.count = 0
+        self.started = self.last_logged = time.monotonic()
+
+    def add(self, count=1):
+        self.count += count
+        now = time.monotonic()
+        if now - self.last_logged >= self.interval:
+            self.last_logged = now
+            elapsed = now - self.started
+            self.logger.info(
+                f"{self.label}: {self.count} {self.unit} so far ({self.count / elapsed:.1f} {self.unit}/s)")
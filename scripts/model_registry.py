@@ -0,0 +1,88 @@
+"""Process-wide registry of YOLO models, loaded on first use.
+
+Importing ultralytics pulls in torch, which takes seconds, so nothing is
+imported or loaded until a model is first asked for. Each (weights, format)
+pair is loaded once per process and shared by every later caller.
+
+With YOLO_EXPORT_FORMAT set to ``onnx`` or ``openvino`` the weights are
+exported once, next to the ``.pt`` file, and the exported model is used for
+faster CPU inference; later processes load the existing export directly.
+"""
+import os
+import logging
+import threading
+from importlib import metadata
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Model weights and the version recorded with every processed image
+MODEL_NAME = os.getenv("YOLO_MODEL", "yolov8n.pt")
+
+# "pytorch" runs the weights as they are; "onnx" or "openvino" exports them first
+EXPORT_FORMAT = os.getenv("YOLO_EXPORT_FORMAT", "pytorch")
+EXPORT_FORMATS = ("pytorch", "onnx", "openvino")
+
+_models = {}
+_lock = threading.Lock()
+
+
+def model_version():
+    """Return the version recorded with detections, without importing ultralytics."""
+    version = os.getenv("YOLO_MODEL_VERSION")
+    if version:
+        return version
+    try:
+        return metadata.version("ultralytics")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def exported_path(name, export_format):
+    """Return where ultralytics writes the ``export_format`` export of weights ``name``."""
+    weights = Path(name)
+    if export_format == "onnx":
+        return weights.with_suffix(".onnx")
+    if export_format == "openvino":
+        return weights.with_name(f"{weights.stem}_openvino_model")
+    raise ValueError(f"Unsupported export format: {export_format}")
+
+
+def _load(name, export_format):
+    from ultralytics import YOLO
+
+    if export_format == "pytorch":
+        return YOLO(name)
+
+    path = exported_path(name, export_format)
+    if not path.exists():
+        logger.info(f"Exporting {name} to {export_format}")
+        # Dynamic input shapes so batches of any size can be run
+        path = Path(YOLO(name).export(format=export_format, dynamic=True))
+    return YOLO(str(path), task="detect")
+
+
+def get_model(name=MODEL_NAME, export_format=EXPORT_FORMAT):
+    """Return the shared model for weights ``name``, loading it on first use."""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+    key = (name, export_format)
+    model = _models.get(key)
+    if model is None:
+        with _lock:
+            model = _models.get(key)
+            if model is None:
+                model = _models[key] = _load(name, export_format)
+    return model
+
+
+def register_model(name, model, export_format=EXPORT_FORMAT):
+    """Use ``model`` for weights ``name`` instead of loading it (stand-in models)."""
+    with _lock:
+        _models[(name, export_format)] = model
+
+
+def clear_models():
+    """Forget every loaded model so the next ``get_model`` loads it again."""
+    with _lock:
+        _models.clear()
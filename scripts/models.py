@@ -1,5 +1,6 @@
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime
+from sqlalchemy.orm import declarative_base
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, String, Boolean, Float, DateTime
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
 
 Base = declarative_base()
 
@@ -7,20 +8,34 @@ class FctMessage(Base):
     __tablename__ = "fct_messages"
     __table_args__ = {"schema": "marts"}
 
-    message_id = Column(Integer, primary_key=True)
-    channel_name = Column(String)
+    channel_id = Column(BigInteger, primary_key=True)
+    message_id = Column(BigInteger, primary_key=True)
+    date_id = Column(Integer)
     message_text = Column(String)
     has_media = Column(Boolean)
     media_type = Column(String)
     media_path = Column(String)
-    date_id = Column(Integer)
-    channel_id = Column(Integer)
+    detected_labels = Column(ARRAY(String))
+    top_label = Column(String)
+    max_confidence = Column(Float)
+    detection_count = Column(BigInteger)
+    search_vector = Column(TSVECTOR)
+    loaded_at = Column(DateTime(timezone=True))
+    dbt_updated_at = Column(DateTime(timezone=True))
 
 class ImageDetection(Base):
     __tablename__ = "image_detections"
     __table_args__ = {"schema": "raw"}
 
-    message_id = Column(Integer, primary_key=True)
+    detection_id = Column(BigInteger, primary_key=True)
+    detection_timestamp = Column(DateTime(timezone=True), primary_key=True)
+    message_id = Column(BigInteger)
     channel_name = Column(String)
-    product_label = Column(String)
+    label_id = Column(SmallInteger)
     confidence = Column(Float)
+    x = Column(Float)
+    y = Column(Float)
+    width = Column(Float)
+    height = Column(Float)
+    model_name = Column(String)
+    model_version = Column(String)
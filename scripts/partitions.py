@@ -0,0 +1,199 @@
+"""Monthly range partitioning for the raw tables.
+
+Partitions are named ``<table>_pYYYY_MM`` and cover one UTC calendar month.
+Every partitioned table also has a ``<table>_default`` partition so rows
+outside the prepared months are never rejected; creating the month's
+partition later moves them out of it.
+"""
+from datetime import date, datetime, timezone
+
+# Months after the current one that loaders prepare partitions for
+MONTHS_AHEAD = 3
+
+
+def month_start(value):
+    """Return the first day of the month containing a date or datetime."""
+    if isinstance(value, datetime):
+        value = value.astimezone(timezone.utc).date()
+    return value.replace(day=1)
+
+
+def add_months(month, count):
+    """Return the first day of the month ``count`` months after ``month``."""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upcoming_months(count=MONTHS_AHEAD, today=None):
+    """Return the current month and the ``count`` months after it."""
+    current = month_start(today or datetime.now(timezone.utc))
+    return [add_months(current, offset) for offset in range(count + 1)]
+
+
+def partition_name(table, month):
+    return f"{table}_p{month.year:04d}_{month.month:02d}"
+
+
+def _bound(month):
+    return f"'{month.isoformat()} 00:00:00+00'"
+
+
+def _lock_partitions(cur, table):
+    """Serialize partition DDL on ``table`` until the current transaction ends.
+
+    Loaders for different channels run concurrently and would otherwise
+    race to create the same month's partition.
+    """
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (table,))
+
+
+def _partition_column(cur, table):
+    """Return the column a range-partitioned table is partitioned on."""
+    cur.execute("""
+        SELECT a.attname
+        FROM pg_partitioned_table p
+        JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+        WHERE p.partrelid = to_regclass(%s)
+    """, (table,))
+    return cur.fetchone()[0]
+
+
+def set_aside_unpartitioned(cur, table):
+    """Rename a plain (unpartitioned) ``table`` out of the way so a partitioned one can replace it.
+
+    The old table's indexes are dropped, both to free their names and to
+    speed up copying rows out of it. Takes the partition lock, so callers
+    creating ``table`` right after do so one at a time. Returns the old
+    table's new name, or None if ``table`` is missing or already partitioned.
+    """
+    _lock_partitions(cur, table)
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cur.fetchone()
+    if row is None or row[0] == "p":
+        return None
+
+    schema, name = table.split(".")
+    legacy = f"{schema}.{name}_unpartitioned"
+    cur.execute(f"ALTER TABLE {table} RENAME TO {name}_unpartitioned")
+    cur.execute("""
+        SELECT i.indexrelid::regclass::text
+        FROM pg_index i
+        LEFT JOIN pg_constraint c ON c.conindid = i.indexrelid
+        WHERE i.indrelid = to_regclass(%s) AND c.oid IS NULL
+    """, (legacy,))
+    for (index,) in cur.fetchall():
+        cur.execute(f"DROP INDEX {index}")
+    return legacy
+
+
+def ensure_partitions(cur, table, months):
+    """Create the monthly partitions of ``table`` that do not exist yet.
+
+    Rows already sitting in the default partition for a new month are moved
+    into it. Holds a transaction-level lock on ``table``'s partitions, so
+    commit soon after. Returns the names of the partitions created.
+    """
+    _lock_partitions(cur, table)
+    column = _partition_column(cur, table)
+
+    created = []
+    for month in sorted(set(months)):
+        partition = partition_name(table, month)
+        cur.execute("SELECT to_regclass(%s)", (partition,))
+        if cur.fetchone()[0] is not None:
+            continue
+
+        lower, upper = _bound(month), _bound(add_months(month, 1))
+        # Built detached so stray rows can be moved in from the default
+        # partition before the new bounds are validated against it
+        cur.execute(f"""
+            CREATE TABLE {partition} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS);
+            WITH moved AS (
+                DELETE FROM {table}_default
+                WHERE {column} >= {lower} AND {column} < {upper}
+                RETURNING *
+            )
+            INSERT INTO {partition} SELECT * FROM moved;
+            ALTER TABLE {table} ATTACH PARTITION {partition}
+                FOR VALUES FROM ({lower}) TO ({upper});
+        """)
+        created.append(partition)
+    return created
+
+
+def migrate_rows(cur, legacy, table):
+    """Copy every row of a set-aside plain table into partitioned ``table`` and drop it.
+
+    Only columns present in both tables are copied; rows without a value
+    for the partition key, or duplicating a key already copied, are left
+    behind. Returns the number of rows copied.
+    """
+    column = _partition_column(cur, table)
+
+    schema, name = table.split(".")
+    legacy_name = legacy.split(".")[1]
+    cur.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = %s AND table_name = %s
+          AND column_name IN (
+              SELECT column_name FROM information_schema.columns
+              WHERE table_schema = %s AND table_name = %s)
+        ORDER BY ordinal_position
+    """, (schema, legacy_name, schema, name))
+    columns = ", ".join(row[0] for row in cur.fetchall())
+
+    cur.execute(f"""
+        SELECT DISTINCT date_trunc('month', {column} AT TIME ZONE 'UTC')::DATE
+        FROM {legacy} WHERE {column} IS NOT NULL
+    """)
+    ensure_partitions(cur, table, [row[0] for row in cur.fetchall()])
+
+    cur.execute(f"""
+        INSERT INTO {table} ({columns})
+        SELECT {columns} FROM {legacy} WHERE {column} IS NOT NULL
+        ON CONFLICT DO NOTHING
+    """)
+    copied = cur.rowcount
+    cur.execute(f"DROP TABLE {legacy}")
+    return copied
+
+
+def drop_partitions_before(cur, table, cutoff):
+    """Drop the monthly partitions of ``table`` that end on or before ``cutoff``.
+
+    Rows older than ``cutoff`` in the default partition are deleted as well.
+    Holds the same lock as ``ensure_partitions``. Returns the names of the
+    partitions dropped.
+    """
+    _lock_partitions(cur, table)
+    cutoff = month_start(cutoff)
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+    """, (table,))
+    schema, name = table.split(".")
+    prefix = f"{name}_p"
+
+    dropped = []
+    for (relname,) in cur.fetchall():
+        if not relname.startswith(prefix):
+            continue
+        try:
+            year, month = (int(part) for part in relname[len(prefix):].split("_"))
+        except ValueError:
+            continue
+        if add_months(date(year, month, 1), 1) <= cutoff:
+            # Dropping a partition is a metadata change; no rows are scanned
+            cur.execute(f"DROP TABLE {schema}.{relname}")
+            dropped.append(f"{schema}.{relname}")
+
+    column = _partition_column(cur, table)
+    cur.execute(f"DELETE FROM {table}_default WHERE {column} < {_bound(cutoff)}")
+    return sorted(dropped)
+
+
+def retention_cutoff(months, today=None):
+    """Return the first day of the oldest month kept when retaining ``months`` full months."""
+    return add_months(month_start(today or datetime.now(timezone.utc)), -months)
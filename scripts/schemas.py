@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
-from datetime import datetime
+from datetime import date, datetime
 
 
 class MessageSchema(BaseModel):
@@ -10,25 +10,66 @@ class MessageSchema(BaseModel):
     has_media: bool
     media_type: str | None
     media_path: str | None
+    rank: float | None = None
+
+
+class MessageListItem(BaseModel):
+    message_id: int
+    channel_name: str
+    date: date
+    message_text: str | None
+    has_media: bool
+    media_type: str | None
+    media_path: str | None
+    detected_labels: List[str] | None = None
+    top_label: str | None = None
+    max_confidence: float | None = None
+    detection_count: int = 0
+
+
+class MessagePage(BaseModel):
+    items: List[MessageListItem]
+    next_cursor: Optional[str] = None
+
+
+class DetectionSchema(BaseModel):
+    # model_name and model_version are columns, not pydantic's model_ API
+    model_config = ConfigDict(protected_namespaces=())
+
+    detection_id: int
+    message_id: int
+    channel_name: str
+    # NULL for converted rows whose label was never recorded
+    product_label: str | None
+    confidence: float
+    x: float | None
+    y: float | None
+    width: float | None
+    height: float | None
+    model_name: str | None
+    model_version: str | None
+    detection_timestamp: datetime
+
+
+class DetectionPage(BaseModel):
+    items: List[DetectionSchema]
+    next_cursor: Optional[str] = None
 
 
 class TopProductSchema(BaseModel):
     product_label: str
     count: int
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class ChannelActivitySchema(BaseModel):
     date: str
     message_count: int
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class ProductStat(BaseModel):
     product_label: str
     mention_count: int
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
@@ -1,66 +1,293 @@
 from telethon.sync import TelegramClient
 from telethon.errors import FloodWaitError, RPCError
-from dotenv import load_dotenv
 import os
 import json
+import time
 import logging
 import asyncio
+import argparse
 from datetime import datetime, timedelta
+from pathlib import Path
 import aiofiles
 import pytz
+from filelock import FileLock
 
-# Load environment variables
-load_dotenv()
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library
+    orjson = None
 
-# Configure logging to file and console
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-
-# File handler
-file_handler = logging.FileHandler('logs/scrape.log')
-file_handler.setFormatter(logging.Formatter(
-    '%(asctime)s - %(levelname)s - %(message)s'))
-
-# Console handler
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(logging.Formatter(
-    '%(asctime)s - %(levelname)s - %(message)s'))
+from scripts.logging_config import configure_logging
+from scripts.metrics import MESSAGES_SCRAPED, BYTES_DOWNLOADED, STAGE_SECONDS, THROUGHPUT, ProgressLog
 
-# Add both handlers to the logger
-logger.handlers = []  # Clear any existing handlers
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
+# Handlers are attached by configure_logging() when scraping starts
+logger = logging.getLogger(__name__)
 
 # Telegram API credentials
 api_id = os.getenv("TELEGRAM_API_ID")
 api_hash = os.getenv("TELEGRAM_API_HASH")
 phone = os.getenv("TELEGRAM_PHONE")  # Optional: for first-time authentication
 
+# Repository root; default paths do not depend on the working directory
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+# Telethon session file (".session" is appended)
+SESSION_PATH = os.getenv("TELEGRAM_SESSION_PATH", str(PROJECT_ROOT / "scripts" / "session"))
+
 # Data lake directory
-DATA_LAKE_PATH = "../data/raw/telegram_messages"
+DATA_LAKE_PATH = os.getenv("DATA_LAKE_PATH", str(PROJECT_ROOT / "data" / "raw" / "telegram_messages"))
+
+# Per-channel high-water marks (last message_id scraped)
+CHECKPOINT_PATH = os.getenv("SCRAPE_CHECKPOINT_PATH",
+                            str(PROJECT_ROOT / "data" / "state" / "scrape_checkpoints.json"))
+
+# Window scraped for channels that have no checkpoint yet
+INITIAL_LOOKBACK_DAYS = 30
+
+# List of Telegram channels to scrape (comma-separated in TELEGRAM_CHANNELS)
+CHANNELS = os.getenv("TELEGRAM_CHANNELS", "chemed123,lobelia4cosmetics,tikvahpharma").split(",")
+
+# Maximum number of channels scraped at the same time
+MAX_CONCURRENT_CHANNELS = int(os.getenv("SCRAPE_CONCURRENCY", "4"))
+
+# Give up on a channel after this many consecutive FloodWaitErrors
+MAX_FLOOD_RETRIES = 5
+
+# Number of concurrent photo downloads per channel
+DOWNLOAD_WORKERS = int(os.getenv("SCRAPE_DOWNLOAD_WORKERS", "4"))
+
+# Photos waiting for a download worker; iteration pauses when this is full
+DOWNLOAD_QUEUE_SIZE = 100
+
+# Buffered JSON lines are flushed once they reach this size or age
+WRITER_FLUSH_BYTES = 256 * 1024
+WRITER_FLUSH_SECONDS = 5.0
+
+
+class CheckpointStore:
+    """JSON file holding the highest message_id scraped for each channel.
+
+    Several scrape processes may share the file, so every save re-reads it
+    under a file lock and keeps the highest checkpoint of each channel.
+    """
+
+    def __init__(self, path=CHECKPOINT_PATH):
+        self.path = Path(path)
+        self._lock = FileLock(f"{self.path}.lock")
+        self.checkpoints = self._read()
+
+    def _read(self):
+        if not self.path.exists():
+            return {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def get(self, channel):
+        """Return the channel's high-water mark, or None if it was never scraped."""
+        return self.checkpoints.get(channel, {}).get("last_message_id")
+
+    def update(self, channel, message_id):
+        """Raise the channel's high-water mark to ``message_id`` and persist it."""
+        current = self.get(channel)
+        if message_id is None or (current is not None and message_id <= current):
+            return
+        self.checkpoints[channel] = {
+            "last_message_id": message_id,
+            "updated_at": datetime.now(pytz.UTC).isoformat(),
+        }
+        self.save()
+
+    def save(self):
+        """Merge with the checkpoints on disk and write them atomically.
+
+        Checkpoints saved by other processes since this store read the file
+        are kept unless this store has a higher one for the channel, and a
+        crash never leaves a partial file.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            merged = self._read()
+            for channel, checkpoint in self.checkpoints.items():
+                current = merged.get(channel, {}).get("last_message_id")
+                if current is None or checkpoint["last_message_id"] > current:
+                    merged[channel] = checkpoint
+            self.checkpoints = merged
+
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.checkpoints, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+def _serialize(message_data):
+    """Serialize a message as one UTF-8 encoded JSON line."""
+    if orjson is not None:
+        return orjson.dumps(message_data) + b"\n"
+    return (json.dumps(message_data) + "\n").encode("utf-8")
+
+
+class JsonlWriter:
+    """Buffered appender for a channel's daily JSON files.
+
+    File handles stay open for the writer's lifetime and serialized lines
+    are buffered in memory, then written in one call per file once the
+    buffer reaches ``flush_bytes`` or is older than ``flush_seconds``.
+    ``close`` must be called (also on errors) to flush what is left.
+    """
+
+    def __init__(self, flush_bytes=WRITER_FLUSH_BYTES, flush_seconds=WRITER_FLUSH_SECONDS):
+        self.flush_bytes = flush_bytes
+        self.flush_seconds = flush_seconds
+        self._handles = {}
+        self._buffers = {}
+        self._buffered_bytes = 0
+        self._last_flush = time.monotonic()
+
+    async def write(self, file_path, message_data):
+        """Buffer one message for ``file_path`` and return its size in bytes."""
+        line = _serialize(message_data)
+        self._buffers.setdefault(file_path, []).append(line)
+        self._buffered_bytes += len(line)
+
+        if (self._buffered_bytes >= self.flush_bytes
+                or time.monotonic() - self._last_flush >= self.flush_seconds):
+            await self.flush()
+        return len(line)
+
+    async def flush(self):
+        """Write all buffered lines to their files."""
+        buffers, self._buffers = self._buffers, {}
+        self._buffered_bytes = 0
+        self._last_flush = time.monotonic()
+
+        for file_path, lines in buffers.items():
+            handle = self._handles.get(file_path)
+            if handle is None:
+                handle = await aiofiles.open(file_path, "ab")
+                self._handles[file_path] = handle
+            await handle.write(b"".join(lines))
+            await handle.flush()
+
+    async def close(self):
+        """Flush remaining lines and close every open file."""
+        try:
+            await self.flush()
+        finally:
+            handles, self._handles = self._handles, {}
+            for handle in handles.values():
+                await handle.close()
 
-# List of Telegram channels to scrape
-CHANNELS = ["chemed123", "lobelia4cosmetics", "tikvahpharma"]
 
-async def scrape_channel(client, channel, start_date, end_date):
-    """Scrape messages and images from a Telegram channel."""
+def _media_already_downloaded(media_path, expected_size):
+    """Return True if ``media_path`` exists and matches the expected size."""
     try:
-        logger.info(f"Starting scrape for channel: {channel}")
-        os.makedirs(DATA_LAKE_PATH, exist_ok=True)
+        size = os.path.getsize(media_path)
+    except OSError:
+        return False
+    if expected_size:
+        return size == expected_size
+    return size > 0
 
-        # Get channel entity
-        entity = await client.get_entity(channel)
 
-        # Create directory for channel
-        channel_path = os.path.join(DATA_LAKE_PATH, channel)
-        os.makedirs(channel_path, exist_ok=True)
+async def _write_message(writer, file_path, message_data, stats, progress):
+    """Append one message to its daily JSON file."""
+    size = await writer.write(file_path, message_data)
+    stats["bytes"] += size
+    stats["messages"] += 1
+    MESSAGES_SCRAPED.labels(channel=stats["channel"]).inc()
+    BYTES_DOWNLOADED.labels(channel=stats["channel"]).inc(size)
+    progress.add()
 
+
+async def _download_worker(client, channel, queue, writer, stats, progress):
+    """Download queued photos and write their messages once the file is on disk."""
+    while True:
+        item = await queue.get()
+        try:
+            message, message_data, file_path, media_path = item
+            expected_size = message.file.size if message.file else None
+
+            if _media_already_downloaded(media_path, expected_size):
+                message_data["media_type"] = "photo"
+                message_data["media_path"] = media_path
+                stats["skipped_downloads"] += 1
+                logger.debug(
+                    f"Image for message {message.id} in {channel} already on disk, skipping")
+            else:
+                for attempt in range(MAX_FLOOD_RETRIES + 1):
+                    try:
+                        await client.download_media(message, media_path)
+                        message_data["media_type"] = "photo"
+                        message_data["media_path"] = media_path
+                        media_size = os.path.getsize(media_path)
+                        stats["bytes"] += media_size
+                        BYTES_DOWNLOADED.labels(channel=channel).inc(media_size)
+                        logger.debug(
+                            f"Downloaded image for message {message.id} in {channel}")
+                        break
+                    except FloodWaitError as e:
+                        if attempt == MAX_FLOOD_RETRIES:
+                            logger.error(
+                                f"Failed to download media for message {message.id}: {str(e)}")
+                            break
+                        logger.warning(
+                            f"Rate limit hit downloading media for {channel}. Waiting {e.seconds} seconds.")
+                        await asyncio.sleep(e.seconds)
+                    except Exception as e:
+                        logger.error(
+                            f"Failed to download media for message {message.id}: {str(e)}")
+                        break
+
+            await _write_message(writer, file_path, message_data, stats, progress)
+        except Exception as e:
+            logger.error(f"Unexpected error in download worker for {channel}: {str(e)}")
+        finally:
+            queue.task_done()
+
+
+async def _scrape_channel_messages(client, channel, start_date, end_date, writer, stats, download_workers, min_id,
+                                   progress):
+    """Iterate a channel's messages and write them to the data lake.
+
+    With ``min_id`` only messages newer than it are fetched and ``start_date``
+    is ignored; otherwise everything between ``start_date`` and ``end_date``
+    is fetched. ``stats["oldest_message_id"]`` records the oldest message
+    iterated, including the one that ends the range, or 0 once the channel's
+    history is exhausted.
+
+    Photos are handed to a pool of download workers through a bounded queue,
+    so iteration only waits on downloads when the queue is full. Progress is
+    recorded in ``stats`` so that a retry after a FloodWaitError can resume
+    from the last message queued instead of starting over.
+    """
+    os.makedirs(DATA_LAKE_PATH, exist_ok=True)
+
+    # Get channel entity
+    entity = await client.get_entity(channel)
+
+    # Create directories for channel and its images
+    channel_path = os.path.join(DATA_LAKE_PATH, channel)
+    images_path = os.path.join(channel_path, "images")
+    os.makedirs(images_path, exist_ok=True)
+
+    # Resume below the last queued message when retrying
+    offset_id = stats["last_message_id"] or 0
+
+    queue = asyncio.Queue(maxsize=DOWNLOAD_QUEUE_SIZE)
+    workers = [
+        asyncio.create_task(_download_worker(client, channel, queue, writer, stats, progress))
+        for _ in range(max(1, download_workers))
+    ]
+
+    try:
         # Iterate over messages
-        async for message in client.iter_messages(entity, limit=1000, offset_date=end_date):
+        async for message in client.iter_messages(
+                entity, offset_date=end_date, offset_id=offset_id, min_id=min_id):
             # Debug: Log message date
             logger.debug(f"Message {message.id} date: {message.date}")
+            stats["oldest_message_id"] = min(stats["oldest_message_id"] or message.id, message.id)
 
-            if message.date < start_date:
+            if not min_id and message.date < start_date:
                 logger.info(
                     f"Reached messages before {start_date} for {channel}, stopping.")
                 break
@@ -78,40 +305,159 @@ async def scrape_channel(client, channel, start_date, end_date):
                 "media_path": None
             }
 
-            # Handle media (images)
+            stats["last_message_id"] = message.id
+            stats["max_message_id"] = max(stats["max_message_id"] or 0, message.id)
+
+            # Hand photos to the download workers; blocks when the queue is full
             if message.photo:
-                media_path = os.path.join(
-                    channel_path, "images", f"{message.id}.jpg")
-                os.makedirs(os.path.dirname(media_path), exist_ok=True)
+                media_path = os.path.join(images_path, f"{message.id}.jpg")
+                await queue.put((message, message_data, file_path, media_path))
+                continue
+
+            await _write_message(writer, file_path, message_data, stats, progress)
+            logger.debug(f"Scraped message {message.id} from {channel}")
+        else:
+            if not min_id:
+                # No older messages left, so the range reaches the channel's start
+                stats["oldest_message_id"] = 0
+    finally:
+        # Let the workers finish everything already queued before returning
+        await queue.join()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+async def scrape_channel(client, channel, start_date, end_date, semaphore=None,
+                         download_workers=DOWNLOAD_WORKERS, min_id=0):
+    """Scrape messages and images from a Telegram channel.
+
+    When a semaphore is given, the channel only holds a slot while it is
+    actively talking to Telegram; FloodWait back-offs happen outside of it so
+    other channels keep running.
+
+    Returns a dict with the channel's message count, byte count, elapsed
+    seconds, throughput, highest message_id seen and whether the scrape
+    completed.
+    """
+    semaphore = semaphore or asyncio.Semaphore(1)
+    stats = {
+        "channel": channel,
+        "messages": 0,
+        "bytes": 0,
+        "skipped_downloads": 0,
+        "last_message_id": None,
+        "max_message_id": None,
+        "oldest_message_id": None,
+        "completed": False,
+    }
+    started = time.monotonic()
+    logger.info(f"Starting scrape for channel: {channel}")
+
+    writer = JsonlWriter()
+    progress = ProgressLog(logger, f"Scraping {channel}", "messages")
+    try:
+        for attempt in range(MAX_FLOOD_RETRIES + 1):
+            wait_seconds = None
+            async with semaphore:
                 try:
-                    await client.download_media(message, media_path)
-                    message_data["media_type"] = "photo"
-                    message_data["media_path"] = media_path
-                    logger.info(
-                        f"Downloaded image for message {message.id} in {channel}")
+                    await _scrape_channel_messages(
+                        client, channel, start_date, end_date, writer, stats, download_workers, min_id,
+                        progress)
+                    stats["completed"] = True
+                except FloodWaitError as e:
+                    wait_seconds = e.seconds
+                except RPCError as e:
+                    logger.error(f"Telegram API error for {channel}: {str(e)}")
                 except Exception as e:
-                    logger.error(
-                        f"Failed to download media for message {message.id}: {str(e)}")
+                    logger.error(f"Unexpected error for {channel}: {str(e)}")
+
+            if wait_seconds is None:
+                break
+            if attempt == MAX_FLOOD_RETRIES:
+                logger.error(
+                    f"Giving up on {channel} after {MAX_FLOOD_RETRIES} rate limit retries.")
+                break
+            logger.warning(
+                f"Rate limit hit for {channel}. Waiting {wait_seconds} seconds.")
+            await asyncio.sleep(wait_seconds)
+    finally:
+        # Flush buffered lines even when the scrape failed part way
+        try:
+            await writer.close()
+        except Exception as e:
+            stats["completed"] = False
+            logger.error(f"Failed to flush messages for {channel}: {str(e)}")
+
+    elapsed = time.monotonic() - started
+    STAGE_SECONDS.labels(stage="scrape_channel").observe(elapsed)
+    stats["elapsed_seconds"] = elapsed
+    stats["messages_per_second"] = stats["messages"] / elapsed if elapsed else 0.0
+    stats["bytes_per_second"] = stats["bytes"] / elapsed if elapsed else 0.0
+    logger.info(
+        f"Finished {channel}: {stats['messages']} messages, {stats['bytes']} bytes in {elapsed:.1f}s "
+        f"({stats['messages_per_second']:.1f} msg/s, {stats['bytes_per_second'] / 1024:.1f} KiB/s, "
+        f"{stats['skipped_downloads']} images already on disk)")
+    return stats
+
+
+def _reaches_checkpoint(stats, checkpoint):
+    """Return True if a completed backfill fetched every message after ``checkpoint``."""
+    if checkpoint is None:
+        return True
+    oldest = stats["oldest_message_id"]
+    return oldest is not None and oldest <= checkpoint + 1
 
-            # Append to JSON file
-            async with aiofiles.open(file_path, "a", encoding="utf-8") as f:
-                await f.write(json.dumps(message_data) + "\n")
 
-            logger.info(f"Scraped message {message.id} from {channel}")
+async def scrape_channels(client, channels, start_date, end_date, concurrency=MAX_CONCURRENT_CHANNELS,
+                          download_workers=DOWNLOAD_WORKERS, checkpoints=None, backfill=False):
+    """Scrape several channels as concurrent tasks sharing one client.
 
-    except FloodWaitError as e:
-        logger.warning(
-            f"Rate limit hit for {channel}. Waiting {e.seconds} seconds.")
-        await asyncio.sleep(e.seconds)
-    except RPCError as e:
-        logger.error(f"Telegram API error for {channel}: {str(e)}")
-    except Exception as e:
-        logger.error(f"Unexpected error for {channel}: {str(e)}")
+    At most ``concurrency`` channels are scraped at the same time. With a
+    CheckpointStore, channels that have a checkpoint only fetch messages
+    newer than it, and the checkpoint is raised once the channel completes.
+    In backfill mode checkpoints are not used to limit the scrape, so the
+    whole ``start_date``..``end_date`` range is fetched; the checkpoint is
+    only raised if that range reached down to it, so incremental runs never
+    skip the messages between the checkpoint and the backfilled range.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    started = time.monotonic()
 
+    async def run(channel):
+        min_id = 0
+        if checkpoints is not None and not backfill:
+            min_id = checkpoints.get(channel) or 0
+            if min_id:
+                logger.info(f"Resuming {channel} after message {min_id}")
+        stats = await scrape_channel(
+            client, channel, start_date, end_date, semaphore, download_workers, min_id)
+        # Only a completed scrape covers the whole gap up to the newest message
+        if checkpoints is not None and stats["completed"]:
+            if not backfill or _reaches_checkpoint(stats, checkpoints.get(channel)):
+                checkpoints.update(channel, stats["max_message_id"])
+        return stats
 
-async def main():
-    """Main function to scrape multiple channels."""
-    async with TelegramClient('session', api_id, api_hash) as client:
+    results = await asyncio.gather(*(run(channel) for channel in channels))
+
+    elapsed = time.monotonic() - started
+    total_messages = sum(r["messages"] for r in results)
+    total_bytes = sum(r["bytes"] for r in results)
+    THROUGHPUT.labels(stage="scrape").set(total_messages / elapsed if elapsed else 0.0)
+    logger.info(
+        f"Scraped {len(results)} channels: {total_messages} messages, {total_bytes} bytes in {elapsed:.1f}s "
+        f"with concurrency {concurrency}")
+    return results
+
+
+async def main(concurrency=MAX_CONCURRENT_CHANNELS, download_workers=DOWNLOAD_WORKERS,
+               backfill=False, start_date=None, end_date=None, channels=None):
+    """Main function to scrape multiple channels.
+
+    Scrapes ``channels`` (default: CHANNELS) and returns their stats.
+    """
+    configure_logging(logger, 'scrape.log')
+    async with TelegramClient(SESSION_PATH, api_id, api_hash) as client:
         # Optional: Authenticate if not already logged in
         if not await client.is_user_authorized():
             await client.send_code_request(phone)
@@ -120,14 +466,34 @@ async def main():
 
         # Set timezone to UTC for consistency
         utc = pytz.UTC
-        end_date = datetime.now(utc)
-        start_date = end_date - timedelta(days=30)
+        end_date = end_date or datetime.now(utc)
+        start_date = start_date or end_date - timedelta(days=INITIAL_LOOKBACK_DAYS)
 
         # Debug: Log start and end dates
-        logger.debug(f"Scraping from {start_date} to {end_date}")
+        logger.debug(f"Scraping from {start_date} to {end_date} (backfill={backfill})")
+
+        return await scrape_channels(client, channels or CHANNELS, start_date, end_date, concurrency,
+                                     download_workers, checkpoints=CheckpointStore(), backfill=backfill)
+
+
+def _parse_date(value):
+    """Parse a YYYY-MM-DD command line date as midnight UTC."""
+    return pytz.UTC.localize(datetime.strptime(value, "%Y-%m-%d"))
 
-        for channel in CHANNELS:
-            await scrape_channel(client, channel, start_date, end_date)
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Scrape Telegram channels into the data lake.")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_CHANNELS,
+                        help="Maximum number of channels scraped at the same time (1 = sequential)")
+    parser.add_argument("--download-workers", type=int, default=DOWNLOAD_WORKERS,
+                        help="Concurrent photo downloads per channel")
+    parser.add_argument("--backfill", action="store_true",
+                        help="Scrape the full --start-date/--end-date range, ignoring checkpoints")
+    parser.add_argument("--start-date", type=_parse_date,
+                        help="Oldest day to scrape (YYYY-MM-DD); defaults to 30 days before --end-date")
+    parser.add_argument("--end-date", type=_parse_date,
+                        help="Scrape messages before this day (YYYY-MM-DD); defaults to now")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.concurrency, args.download_workers,
+                     args.backfill, args.start_date, args.end_date))
@@ -1,9 +1,152 @@
-from dagster import asset
+import os
+import sys
+import asyncio
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from dagster import AssetExecutionContext, Failure, MaterializeResult, asset
+
+from .partitions import channel_day_partitions
+
+PROJECT_ROOT = Path(os.getenv("PIPELINE_ROOT", Path(__file__).resolve().parents[2]))
+SCRIPTS_DIR = PROJECT_ROOT / "scripts"
+DBT_PROJECT_DIR = PROJECT_ROOT / "dbt_project"
+
+
+@contextmanager
+def scripts_environment():
+    """Run pipeline scripts in-process as if started from the scripts directory.
+
+    The scripts are imported through the ``scripts`` package at the
+    repository root, and YOLO weights given by name are found in (or
+    downloaded to) the scripts directory. Each step of the multiprocess executor
+    runs in its own process, and ultralytics (with torch) is only imported
+    once enrichment first asks the model registry for a model.
+    """
+    if str(PROJECT_ROOT) not in sys.path:
+        sys.path.insert(0, str(PROJECT_ROOT))
+    previous = os.getcwd()
+    os.chdir(SCRIPTS_DIR)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def _channel_day(context):
+    """Return the channel and the [start, end) UTC bounds of a channel/day partition."""
+    keys = context.partition_key.keys_by_dimension
+    start = datetime.strptime(keys["date"], "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    return keys["channel"], start, start + timedelta(days=1)
+
+
+@asset(
+    partitions_def=channel_day_partitions,
+    group_name="telegram",
+    # Every scrape uses the same Telethon session file, which only one
+    # client may hold at a time
+    op_tags={"dagster/concurrency_key": "telegram_session"},
+)
+def telegram_message_files(context: AssetExecutionContext):
+    """A channel's messages and photos for one day, scraped into the data lake."""
+    channel, start, end = _channel_day(context)
+    with scripts_environment():
+        from scripts import scrape_telegram
+
+        # A rerun rewrites the day's file instead of appending duplicates to it
+        day_file = Path(scrape_telegram.DATA_LAKE_PATH) / channel / f"{start:%Y-%m-%d}.json"
+        day_file.unlink(missing_ok=True)
+        results = asyncio.run(scrape_telegram.main(
+            concurrency=1, backfill=True, start_date=start, end_date=end, channels=[channel]))
+
+    stats = results[0]
+    if not stats["completed"]:
+        raise Failure(f"Scrape of {channel} for {start:%Y-%m-%d} did not complete")
+    return MaterializeResult(metadata={
+        "messages": stats["messages"],
+        "bytes": stats["bytes"],
+        "skipped_downloads": stats["skipped_downloads"],
+        "elapsed_seconds": stats["elapsed_seconds"],
+        "messages_per_second": stats["messages_per_second"],
+        "bytes_per_second": stats["bytes_per_second"],
+    })
+
+
+@asset(
+    partitions_def=channel_day_partitions,
+    deps=[telegram_message_files],
+    group_name="telegram",
+)
+def raw_telegram_messages(context: AssetExecutionContext):
+    """The day's file for a channel upserted into raw.telegram_messages."""
+    channel, start, _ = _channel_day(context)
+    with scripts_environment():
+        from scripts import load_raw_to_postgres
+
+        summaries = load_raw_to_postgres.load_json_to_postgres(
+            workers=1, channels=[channel], days=[f"{start:%Y-%m-%d}"])
+
+    rows = sum(summary["rows"] for summary in summaries)
+    elapsed = max((summary["elapsed_seconds"] for summary in summaries), default=0.0)
+    return MaterializeResult(metadata={
+        "files": sum(summary["files"] for summary in summaries),
+        "rows": rows,
+        "upserted": sum(summary["upserted"] for summary in summaries),
+        "elapsed_seconds": elapsed,
+        "rows_per_second": rows / elapsed if elapsed else 0.0,
+    })
+
+
+@asset(
+    partitions_def=channel_day_partitions,
+    deps=[raw_telegram_messages],
+    group_name="telegram",
+    # Each step loads its own copy of the model; with YOLO_EXPORT_FORMAT set,
+    # the ONNX/OpenVINO export is written once and loaded by later runs
+    op_tags={"dagster/concurrency_key": "yolo"},
+)
+def image_detections(context: AssetExecutionContext):
+    """YOLO detections for the photos a channel posted on one day."""
+    channel, start, end = _channel_day(context)
+    with scripts_environment():
+        from scripts import enrich_with_yolo
+
+        summary = enrich_with_yolo.enrich_images_with_yolo(
+            channels=[channel], start_date=start, end_date=end)
+
+    return MaterializeResult(metadata={
+        "images": summary["images"],
+        "detections": summary["detections"],
+        "cache_hits": summary["hits"] + summary["phash_hits"],
+        "elapsed_seconds": summary["elapsed_seconds"],
+        "images_per_second": summary["images_per_second"],
+    })
+
+
+@asset(
+    deps=[raw_telegram_messages, image_detections],
+    group_name="marts",
+    # Incremental models must not be built by two runs at once
+    op_tags={"dagster/concurrency_key": "dbt"},
+)
+def dbt_marts(context: AssetExecutionContext):
+    """The dbt staging models and marts, built incrementally."""
+    from dbt.cli.main import dbtRunner
+
+    result = dbtRunner().invoke([
+        "run",
+        "--project-dir", str(DBT_PROJECT_DIR),
+        "--profiles-dir", str(DBT_PROJECT_DIR),
+    ])
+    if not result.success:
+        raise Failure(f"dbt run failed: {result.exception or 'see the dbt logs'}")
+
+    return MaterializeResult(metadata={
+        "models": len(result.result.results),
+        "elapsed_seconds": result.result.elapsed_time,
+    })
 
-# Dummy asset just for startup testing
-@asset
-def dummy_asset():
-    return "Hello from Dagster!"
 
 # Export assets
-all_assets = [dummy_asset]
+all_assets = [telegram_message_files, raw_telegram_messages, image_detections, dbt_marts]
@@ -1,8 +1,9 @@
-from dagster import Definitions, load_assets_from_modules
-from . import assets, jobs, schedules
+from dagster import Definitions
+from . import assets, jobs, schedules, sensors
 
 defs = Definitions(
     assets=assets.all_assets,
-    jobs=[jobs.telegram_pipeline_job],
+    jobs=[jobs.telegram_pipeline_job, jobs.dbt_job],
     schedules=[schedules.daily_schedule],
+    sensors=[sensors.dbt_after_partitions],
 )
@@ -1,9 +1,23 @@
-from dagster import job
-from .ops import scrape_telegram_data, load_raw_to_postgres, run_dbt_transformations, run_yolo_enrichment
+import os
+from dagster import AssetSelection, define_asset_job, multiprocess_executor
+from .assets import telegram_message_files, raw_telegram_messages, image_detections, dbt_marts
 
-@job
-def telegram_pipeline_job():
-    scrape_telegram_data()
-    load_raw_to_postgres()
-    run_dbt_transformations()
-    run_yolo_enrichment()
+# Each step runs in its own process; steps of concurrent runs are further
+# limited by the telegram_session, yolo and dbt concurrency keys
+executor = multiprocess_executor.configured({
+    "max_concurrent": int(os.getenv("PIPELINE_MAX_CONCURRENT_STEPS", "4")),
+})
+
+# Scrape -> load -> enrich for one channel/day partition; the job takes its
+# partitions from the selected assets
+telegram_pipeline_job = define_asset_job(
+    name="telegram_pipeline_job",
+    selection=AssetSelection.assets(telegram_message_files, raw_telegram_messages, image_detections),
+    executor_def=executor,
+)
+
+dbt_job = define_asset_job(
+    name="dbt_job",
+    selection=AssetSelection.assets(dbt_marts),
+    executor_def=executor,
+)
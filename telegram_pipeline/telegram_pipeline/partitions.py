@@ -0,0 +1,17 @@
+import os
+from dagster import DailyPartitionsDefinition, MultiPartitionsDefinition, StaticPartitionsDefinition
+
+# Same variable and default as CHANNELS in scripts/scrape_telegram.py
+CHANNELS = os.getenv("TELEGRAM_CHANNELS", "chemed123,lobelia4cosmetics,tikvahpharma").split(",")
+
+# First day that can be scraped or backfilled
+START_DATE = os.getenv("PIPELINE_START_DATE", "2024-01-01")
+
+daily_partitions = DailyPartitionsDefinition(start_date=START_DATE, timezone="UTC")
+
+# One partition per channel per UTC day, matching the data lake's
+# <channel>/<YYYY-MM-DD>.json files
+channel_day_partitions = MultiPartitionsDefinition({
+    "date": daily_partitions,
+    "channel": StaticPartitionsDefinition(CHANNELS),
+})
@@ -1,8 +1,2 @@
-from dagster import Definitions
-from .jobs import telegram_pipeline_job
-from .schedules import daily_schedule
-
-defs = Definitions(
-    jobs=[telegram_pipeline_job],
-    schedules=[daily_schedule],
-)
+# Kept for tooling that loads this module; the definitions live in definitions.py
+from .definitions import defs  # noqa: F401
@@ -1,8 +1,20 @@
-from dagster import ScheduleDefinition
+from datetime import timedelta
+from dagster import MultiPartitionKey, RunRequest, schedule
 from .jobs import telegram_pipeline_job
+from .partitions import CHANNELS
 
-daily_schedule = ScheduleDefinition(
+
+@schedule(
     job=telegram_pipeline_job,
-    cron_schedule="0 6 * * *",  
+    cron_schedule="0 6 * * *",
+    execution_timezone="UTC",
     name="daily_telegram_pipeline",
 )
+def daily_schedule(context):
+    """Scrape, load and enrich yesterday's partition of every channel."""
+    day = (context.scheduled_execution_time - timedelta(days=1)).strftime("%Y-%m-%d")
+    for channel in CHANNELS:
+        yield RunRequest(
+            run_key=f"{day}|{channel}",
+            partition_key=MultiPartitionKey({"date": day, "channel": channel}),
+        )
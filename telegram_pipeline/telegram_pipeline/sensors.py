@@ -0,0 +1,29 @@
+from dagster import (DagsterRunStatus, MultiPartitionKey, RunRequest, RunStatusSensorContext,
+                     SkipReason, run_status_sensor)
+from .assets import image_detections
+from .jobs import telegram_pipeline_job, dbt_job
+from .partitions import CHANNELS
+
+
+@run_status_sensor(
+    run_status=DagsterRunStatus.SUCCESS,
+    monitored_jobs=[telegram_pipeline_job],
+    request_job=dbt_job,
+)
+def dbt_after_partitions(context: RunStatusSensorContext):
+    """Build the dbt models once every channel of a day has been enriched.
+
+    Later reruns of any of that day's partitions build them again.
+    """
+    day = context.dagster_run.tags.get("dagster/partition/date")
+    if day is None:
+        return SkipReason("Run has no date partition")
+
+    materialized = context.instance.get_materialized_partitions(image_detections.key)
+    missing = [
+        channel for channel in CHANNELS
+        if MultiPartitionKey({"date": day, "channel": channel}) not in materialized
+    ]
+    if missing:
+        return SkipReason(f"Waiting for {', '.join(missing)} on {day}")
+    return RunRequest(run_key=f"dbt-{context.dagster_run.run_id}")
@@ -1 +1,26 @@
+from datetime import datetime, timezone
 
+from dagster import MultiPartitionKey, build_asset_context
+
+from telegram_pipeline.assets import _channel_day
+from telegram_pipeline.definitions import defs
+from telegram_pipeline.partitions import channel_day_partitions
+
+
+def test_definitions_load():
+    repository = defs.get_repository_def()
+    assert {job.name for job in repository.get_all_jobs()} >= {"telegram_pipeline_job", "dbt_job"}
+
+
+def test_channel_day_bounds_are_one_utc_day():
+    context = build_asset_context(
+        partition_key=MultiPartitionKey({"channel": "tikvahpharma", "date": "2024-03-31"}))
+    channel, start, end = _channel_day(context)
+    assert channel == "tikvahpharma"
+    assert start == datetime(2024, 3, 31, tzinfo=timezone.utc)
+    assert end == datetime(2024, 4, 1, tzinfo=timezone.utc)
+
+
+def test_pipeline_job_is_partitioned_by_channel_day():
+    job = defs.get_job_def("telegram_pipeline_job")
+    assert job.partitions_def == channel_day_partitions
@@ -0,0 +1,181 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from pydantic import BaseModel, ValidationError
+from starlette.requests import Request
+
+from scripts import cache
+from scripts.cache import MemoryCache, ResponseCache, etag_matches
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, "time", clock)
+    return clock
+
+
+class StubDB:
+    """Session answering the data version queries with ``version``."""
+
+    def __init__(self, version=1):
+        self.version = version
+        self.queries = 0
+
+    async def execute(self, statement):
+        self.queries += 1
+        if "to_regclass" in str(statement):
+            return SimpleNamespace(scalar=lambda: "public.pipeline_data_version")
+        return SimpleNamespace(scalar=lambda: self.version)
+
+
+class StubBackend:
+    def __init__(self):
+        self.entries = {}
+
+    async def get(self, key):
+        return self.entries.get(key)
+
+    async def set(self, key, value, ttl):
+        self.entries[key] = value
+
+
+class Product(BaseModel):
+    product: str
+    mentions: int
+
+
+def _request(if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def _respond(response_cache, db, loader, if_none_match=None, params=None):
+    return asyncio.run(response_cache.respond(
+        _request(if_none_match), db, "top-products", params or {"limit": 10}, loader, list[Product]))
+
+
+def _loader(rows, calls):
+    async def load():
+        calls.append(1)
+        return rows
+    return load
+
+
+@pytest.mark.parametrize("header, matches", [
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"xyz", "abc"', True),
+    ('"xyz",W/"abc"', True),
+    ("*", True),
+    ('"abcd"', False),
+    ('"ab"', False),
+    ('"xyz"', False),
+    ("", False),
+])
+def test_etag_matches(header, matches):
+    assert etag_matches(header, '"abc"') is matches
+
+
+def test_respond_caches_the_validated_body(clock):
+    backend, db, calls = StubBackend(), StubDB(), []
+    response_cache = ResponseCache(backend)
+    loader = _loader([{"product": "paracetamol", "mentions": 3, "internal": True}], calls)
+
+    first = _respond(response_cache, db, loader)
+    second = _respond(response_cache, db, loader)
+
+    assert calls == [1]
+    assert json.loads(first.body) == [{"product": "paracetamol", "mentions": 3}]
+    assert second.body == first.body
+    assert first.headers["etag"] == second.headers["etag"]
+
+
+def test_respond_rejects_invalid_loader_results(clock):
+    response_cache = ResponseCache(StubBackend())
+    with pytest.raises(ValidationError):
+        _respond(response_cache, StubDB(), _loader([{"product": "paracetamol"}], []))
+
+
+def test_respond_returns_304_for_a_matching_etag(clock):
+    db, calls = StubDB(), []
+    response_cache = ResponseCache(StubBackend())
+    loader = _loader([], calls)
+    etag = _respond(response_cache, db, loader).headers["etag"]
+
+    for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        response = _respond(response_cache, db, loader, if_none_match=header)
+        assert response.status_code == 304
+        assert response.body == b""
+        assert response.headers["etag"] == etag
+    assert _respond(response_cache, db, loader, if_none_match='"other"').status_code == 200
+    assert calls == [1]
+
+
+def test_new_data_version_changes_key_and_etag(clock):
+    db, calls = StubDB(version=1), []
+    response_cache = ResponseCache(StubBackend())
+    loader = _loader([], calls)
+    etag = _respond(response_cache, db, loader).headers["etag"]
+
+    db.version = 2
+    # The version is trusted until DATA_VERSION_CHECK_SECONDS have passed
+    assert _respond(response_cache, db, loader, if_none_match=etag).status_code == 304
+    clock.now += cache.DATA_VERSION_CHECK_SECONDS
+    response = _respond(response_cache, db, loader, if_none_match=etag)
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert calls == [1, 1]
+
+
+def test_data_version_is_reread_after_the_check_interval(clock):
+    db = StubDB(version=4)
+    response_cache = ResponseCache(StubBackend())
+    assert asyncio.run(response_cache.data_version(db)) == 4
+    queries = db.queries
+    clock.now += cache.DATA_VERSION_CHECK_SECONDS - 1
+    assert asyncio.run(response_cache.data_version(db)) == 4
+    assert db.queries == queries
+    clock.now += 1
+    db.version = 5
+    assert asyncio.run(response_cache.data_version(db)) == 5
+
+
+def test_data_version_defaults_to_zero_without_the_table(clock):
+    class NoTable(StubDB):
+        async def execute(self, statement):
+            return SimpleNamespace(scalar=lambda: None)
+
+    assert asyncio.run(ResponseCache(StubBackend()).data_version(NoTable())) == 0
+
+
+def test_memory_cache_expires_entries(clock):
+    memory = MemoryCache()
+    asyncio.run(memory.set("key", b"body", ttl=10))
+    clock.now += 10
+    assert asyncio.run(memory.get("key")) == b"body"
+    clock.now += 1
+    assert asyncio.run(memory.get("key")) is None
+
+
+def test_memory_cache_evicts_least_recently_used(clock):
+    memory = MemoryCache(max_entries=2)
+
+    async def fill():
+        await memory.set("a", b"1", ttl=60)
+        await memory.set("b", b"2", ttl=60)
+        assert await memory.get("a") == b"1"
+        await memory.set("c", b"3", ttl=60)
+        return [await memory.get(key) for key in ("a", "b", "c")]
+
+    assert asyncio.run(fill()) == [b"1", None, b"3"]
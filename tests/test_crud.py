@@ -0,0 +1,42 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from scripts.crud import decode_cursor, encode_cursor, list_detections, list_messages
+from scripts.schemas import DetectionSchema
+
+
+def test_cursor_round_trip():
+    values = ["2024-03-01T10:00:00+00:00", 123456789, "tikvahpharma"]
+    cursor = encode_cursor(values)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == values
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", "!!!", encode_cursor(["x"])[:-3], ""])
+def test_decode_cursor_rejects_malformed_cursors(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize("after", [["2024-03-01T10:00:00+00:00"], ["not a date", 1, 2], {"date": 1}])
+def test_list_messages_rejects_cursors_of_the_wrong_shape(after):
+    # Raised before the query runs, so no database is needed
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        asyncio.run(list_messages(None, cursor=encode_cursor(after)))
+
+
+def test_list_detections_rejects_cursors_of_the_wrong_shape():
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        asyncio.run(list_detections(None, cursor=encode_cursor({"detection_id": 1})))
+
+
+def test_detection_schema_accepts_rows_without_a_label():
+    row = {"detection_id": 1, "message_id": 7, "channel_name": "tikvahpharma", "product_label": None,
+           "confidence": 0.9, "x": None, "y": None, "width": None, "height": None,
+           "model_name": "yolov8n.pt", "model_version": "8.3.7",
+           "detection_timestamp": datetime(2024, 3, 1, tzinfo=timezone.utc)}
+    detection = DetectionSchema.model_validate(row)
+    assert detection.product_label is None
+    assert detection.model_name == "yolov8n.pt"
@@ -0,0 +1,115 @@
+import random
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+from scripts.enrich_with_yolo import (PHASH_MAX_DISTANCE, perceptual_hash, phash_bands, phash_distance,
+                                      process_batch)
+
+
+def _photo(seed=0, size=(480, 640)):
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (12, 16, 3), dtype=np.uint8)
+    return cv2.resize(small, size[::-1], interpolation=cv2.INTER_CUBIC)
+
+
+def test_perceptual_hash_is_a_signed_bigint():
+    for seed in range(20):
+        assert -(1 << 63) <= perceptual_hash(_photo(seed)) < (1 << 63)
+
+
+def test_perceptual_hash_matches_resized_and_reencoded_copies():
+    photo = _photo()
+    resized = cv2.resize(photo, (320, 240), interpolation=cv2.INTER_AREA)
+    _, encoded = cv2.imencode(".jpg", photo, [cv2.IMWRITE_JPEG_QUALITY, 60])
+    reencoded = cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+    assert phash_distance(perceptual_hash(photo), perceptual_hash(resized)) <= PHASH_MAX_DISTANCE
+    assert phash_distance(perceptual_hash(photo), perceptual_hash(reencoded)) <= PHASH_MAX_DISTANCE
+    assert phash_distance(perceptual_hash(photo), perceptual_hash(_photo(seed=1))) > PHASH_MAX_DISTANCE
+
+
+def test_phash_bands_split_the_unsigned_value():
+    assert phash_bands(0x0123456789ABCDEF - (1 << 64)) == [0xCDEF, 0x89AB, 0x4567, 0x0123]
+    assert phash_bands(-1) == [65535] * 4
+    assert phash_distance(-1, 0) == 64
+
+
+def test_near_duplicates_share_a_band():
+    rng = random.Random(0)
+    for _ in range(1000):
+        phash = rng.getrandbits(64) - (1 << 63)
+        flipped = phash
+        for bit in rng.sample(range(64), PHASH_MAX_DISTANCE):
+            flipped ^= 1 << bit
+        flipped = flipped - (1 << 64) if flipped >= (1 << 63) else flipped
+        assert phash_distance(phash, flipped) == PHASH_MAX_DISTANCE
+        assert any(a == b for a, b in zip(phash_bands(phash), phash_bands(flipped)))
+
+
+class FakeCursor:
+    """Cursor serving raw.image_detection_cache rows from a dict keyed by file hash."""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.queries = []
+        self._rows = []
+
+    def execute(self, sql, params):
+        self.queries.append(sql)
+        if "file_hash = ANY" in sql:
+            self._rows = [(file_hash, *self.cache[file_hash]) for file_hash in params[0] if file_hash in self.cache]
+        else:
+            self._rows = []
+
+    def fetchall(self):
+        return self._rows
+
+
+class FakeDetector:
+    """Model returning one 'pill' box covering the top-left quarter of each image."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, images, verbose=False):
+        self.calls.append(len(images))
+        results = []
+        for image in images:
+            height, width = image.shape[:2]
+            box = SimpleNamespace(cls=0, conf=0.9, xyxy=[(0.0, 0.0, width / 2, height / 2)])
+            results.append(SimpleNamespace(boxes=[box], names={0: "pill"}))
+        return results
+
+
+def _item(message_id, file_hash, image, phash=None):
+    return (message_id, "pharma", f"{message_id}.jpg"), image, 1.0, file_hash, phash
+
+
+def test_process_batch_counts_hits_and_misses():
+    image = np.zeros((100, 200, 3), dtype=np.uint8)
+    cursor = FakeCursor({"a": (400, 200, [["pill", 0.8, 40.0, 20.0, 100.0, 50.0]])})
+    detector = FakeDetector()
+    pending_cache = {"p": (200, 100, [["bottle", 0.7, 0.0, 0.0, 10.0, 10.0]], 0b1111)}
+    stats = {"hits": 0, "phash_hits": 0, "misses": 0}
+    batch = [
+        _item(1, "a", image, phash=1 << 40),        # exact hit in the database
+        _item(2, "b", image, phash=1 << 50),        # miss
+        _item(3, "b", image, phash=1 << 50),        # same file as message 2
+        _item(4, "c", image, phash=0b1110),         # near-duplicate of a pending entry
+        _item(5, "p", image, phash=0b1111),         # exact hit in the pending entries
+    ]
+
+    detections, processed = process_batch(cursor, detector, batch, "yolov8n.pt", True, pending_cache, stats,
+                                          min_confidence=0.75)
+
+    assert stats == {"hits": 3, "phash_hits": 1, "misses": 1}
+    assert detector.calls == [1]
+    assert set(pending_cache) == {"p", "b"}
+    assert sorted(processed) == [(1, "pharma", 1), (2, "pharma", 1), (3, "pharma", 1), (4, "pharma", 0),
+                                 (5, "pharma", 0)]
+    # Boxes cached for a 400x200 image are scaled to this 200x100 one
+    assert (1, "pharma", "pill", 0.8, 20.0, 10.0, 50.0, 25.0) in detections
+    assert (2, "pharma", "pill", 0.9, 0.0, 0.0, 100.0, 50.0) in detections
+    # Only the copies of file "b" are looked up by perceptual hash in the database
+    assert sum("phash & 65535" in sql for sql in cursor.queries) == 2
@@ -0,0 +1,73 @@
+import json
+
+from scripts.load_raw_to_postgres import CopyStream, _copy_field, iter_copy_rows
+
+
+def test_copy_field_escapes_text_format_specials():
+    assert _copy_field("a\tb\nc\rd\\e") == b"a\\tb\\nc\\rd\\\\e"
+    assert _copy_field(b"raw\\") == b"raw\\\\"
+
+
+def test_copy_field_encodes_null_booleans_and_numbers():
+    assert _copy_field(None) == b"\\N"
+    assert _copy_field(True) == b"t"
+    assert _copy_field(False) == b"f"
+    assert _copy_field(42) == b"42"
+    assert _copy_field("\\N") == b"\\\\N"
+    assert _copy_field("ጤና") == "ጤና".encode("utf-8")
+
+
+def test_copy_stream_reads_in_chunks():
+    rows = [b"first\n", b"second\n", b"third\n"]
+    stream = CopyStream(iter(rows))
+    chunks = []
+    while True:
+        chunk = stream.read(4)
+        if not chunk:
+            break
+        assert len(chunk) <= 4
+        chunks.append(chunk)
+    assert b"".join(chunks) == b"".join(rows)
+
+
+def test_copy_stream_pulls_rows_lazily():
+    pulled = []
+
+    def rows():
+        for index in range(100):
+            pulled.append(index)
+            yield b"%d\n" % index
+
+    stream = CopyStream(rows())
+    assert stream.read(3) == b"0\n1"
+    assert len(pulled) == 2
+    assert stream.read() == b"".join(b"%d\n" % index for index in range(100))[3:]
+
+
+def test_iter_copy_rows_skips_invalid_lines(tmp_path):
+    message = {"message_id": 7, "date": "2024-03-01T10:00:00+00:00", "text": "Paracetamol\tin stock",
+               "has_media": False, "media_type": None, "media_path": None}
+    json_file = tmp_path / "2024-03-01.json"
+    json_file.write_text(json.dumps(message) + "\n\nnot json\n", encoding="utf-8")
+    stats = {"rows": 0, "skipped": 0}
+
+    rows = list(iter_copy_rows(json_file, "tikvahpharma", stats))
+
+    assert stats == {"rows": 1, "skipped": 1}
+    fields = rows[0].rstrip(b"\n").split(b"\t")
+    assert fields[:7] == [b"7", b"tikvahpharma", b"2024-03-01T10:00:00+00:00",
+                          b"Paracetamol\\tin stock", b"f", b"\\N", b"\\N"]
+
+
+def test_iter_copy_rows_skips_json_that_is_not_a_message(tmp_path):
+    message = {"message_id": 8, "date": "2024-03-01T11:00:00+00:00", "text": None,
+               "has_media": True, "media_type": "photo", "media_path": "photos/8.jpg"}
+    json_file = tmp_path / "2024-03-01.json"
+    json_file.write_text("\n".join(['{"message_id": 7}', "[]", "null", "3", json.dumps(message)]) + "\n",
+                         encoding="utf-8")
+    stats = {"rows": 0, "skipped": 0}
+
+    rows = list(iter_copy_rows(json_file, "tikvahpharma", stats))
+
+    assert stats == {"rows": 1, "skipped": 4}
+    assert rows[0].startswith(b"8\ttikvahpharma\t")
@@ -0,0 +1,38 @@
+from datetime import date, datetime, timedelta, timezone
+
+from scripts.partitions import (add_months, month_start, partition_name, retention_cutoff,
+                                upcoming_months)
+
+
+def test_month_start_of_date():
+    assert month_start(date(2024, 2, 29)) == date(2024, 2, 1)
+
+
+def test_month_start_converts_datetimes_to_utc():
+    # 00:30 on March 1st in UTC+3 is still February in UTC
+    value = datetime(2024, 3, 1, 0, 30, tzinfo=timezone(timedelta(hours=3)))
+    assert month_start(value) == date(2024, 2, 1)
+
+
+def test_add_months_across_years():
+    assert add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+    assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+    assert add_months(date(2024, 1, 1), -13) == date(2022, 12, 1)
+    assert add_months(date(2024, 1, 1), 0) == date(2024, 1, 1)
+
+
+def test_upcoming_months():
+    today = datetime(2024, 11, 15, tzinfo=timezone.utc)
+    assert upcoming_months(2, today=today) == [date(2024, 11, 1), date(2024, 12, 1), date(2025, 1, 1)]
+    assert upcoming_months(0, today=today) == [date(2024, 11, 1)]
+
+
+def test_partition_name():
+    assert partition_name("raw.telegram_messages", date(2024, 3, 1)) == "raw.telegram_messages_p2024_03"
+
+
+def test_retention_cutoff_keeps_full_months():
+    today = datetime(2024, 3, 31, 23, 59, tzinfo=timezone.utc)
+    assert retention_cutoff(1, today=today) == date(2024, 2, 1)
+    assert retention_cutoff(12, today=today) == date(2023, 3, 1)
+    assert retention_cutoff(0, today=today) == date(2024, 3, 1)
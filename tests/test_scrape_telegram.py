@@ -0,0 +1,189 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from scripts import scrape_telegram
+from scripts.scrape_telegram import CheckpointStore, JsonlWriter, scrape_channels
+
+START = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+class FakeClient:
+    """Telegram client serving one text message per hour, newest first."""
+
+    def __init__(self, count):
+        self.messages = [
+            SimpleNamespace(id=message_id, date=START + timedelta(hours=message_id), text=f"message {message_id}",
+                            media=None, photo=None, file=None)
+            for message_id in range(count, 0, -1)
+        ]
+
+    async def get_entity(self, channel):
+        return channel
+
+    async def iter_messages(self, entity, offset_date=None, offset_id=0, min_id=0):
+        for message in self.messages:
+            if offset_date and message.date >= offset_date:
+                continue
+            if offset_id and message.id >= offset_id:
+                continue
+            if message.id <= min_id:
+                return
+            yield message
+
+
+@pytest.fixture
+def lake(tmp_path, monkeypatch):
+    monkeypatch.setattr(scrape_telegram, "DATA_LAKE_PATH", str(tmp_path / "lake"))
+    return tmp_path / "lake"
+
+
+def _scrape(client, checkpoints, start_hour, end_hour, backfill):
+    return asyncio.run(scrape_channels(
+        client, ["pharma"], START + timedelta(hours=start_hour), START + timedelta(hours=end_hour),
+        concurrency=1, download_workers=1, checkpoints=checkpoints, backfill=backfill))
+
+
+def test_checkpoint_only_goes_up(tmp_path):
+    store = CheckpointStore(tmp_path / "checkpoints.json")
+    store.update("pharma", 10)
+    store.update("pharma", 5)
+    store.update("pharma", None)
+    assert store.get("pharma") == 10
+    assert CheckpointStore(tmp_path / "checkpoints.json").get("pharma") == 10
+
+
+def test_save_replaces_the_file_atomically(tmp_path):
+    path = tmp_path / "state" / "checkpoints.json"
+    CheckpointStore(path).update("pharma", 10)
+    assert json.loads(path.read_text())["pharma"]["last_message_id"] == 10
+    assert not path.with_suffix(".tmp").exists()
+
+
+def test_save_keeps_other_processes_checkpoints(tmp_path):
+    path = tmp_path / "checkpoints.json"
+    first, second = CheckpointStore(path), CheckpointStore(path)
+    first.update("pharma", 10)
+    second.update("cosmetics", 7)
+    second.update("pharma", 3)
+    stored = CheckpointStore(path)
+    assert stored.get("pharma") == 10
+    assert stored.get("cosmetics") == 7
+
+
+def test_incremental_scrape_raises_checkpoint(tmp_path, lake):
+    checkpoints = CheckpointStore(tmp_path / "checkpoints.json")
+    checkpoints.update("pharma", 20)
+    results = _scrape(FakeClient(30), checkpoints, 0, 100, backfill=False)
+    assert results[0]["messages"] == 10
+    assert checkpoints.get("pharma") == 30
+
+
+def test_backfill_newer_than_checkpoint_keeps_it(tmp_path, lake):
+    checkpoints = CheckpointStore(tmp_path / "checkpoints.json")
+    checkpoints.update("pharma", 10)
+    # Messages 25-29 only; 11-24 were never fetched
+    results = _scrape(FakeClient(30), checkpoints, 25, 30, backfill=True)
+    assert results[0]["completed"]
+    assert checkpoints.get("pharma") == 10
+
+
+def test_backfill_reaching_checkpoint_raises_it(tmp_path, lake):
+    checkpoints = CheckpointStore(tmp_path / "checkpoints.json")
+    checkpoints.update("pharma", 10)
+    _scrape(FakeClient(30), checkpoints, 11, 30, backfill=True)
+    assert checkpoints.get("pharma") == 29
+
+
+def test_backfill_of_whole_history_raises_checkpoint(tmp_path, lake):
+    checkpoints = CheckpointStore(tmp_path / "checkpoints.json")
+    checkpoints.update("pharma", 2)
+    client = FakeClient(8)
+    # Messages 1-4 were deleted; the backfill runs out of history at 5
+    client.messages = client.messages[:4]
+    _scrape(client, checkpoints, 0, 100, backfill=True)
+    assert checkpoints.get("pharma") == 8
+
+
+def _lines(path):
+    return [json.loads(line) for line in path.read_text().splitlines()] if path.exists() else []
+
+
+def test_writer_flushes_once_the_buffer_is_full(tmp_path):
+    path = tmp_path / "2024-03-01.json"
+
+    async def write():
+        writer = JsonlWriter(flush_bytes=60, flush_seconds=3600)
+        await writer.write(path, {"message_id": 1})
+        assert _lines(path) == []
+        await writer.write(path, {"message_id": 2, "text": "x" * 40})
+        assert [line["message_id"] for line in _lines(path)] == [1, 2]
+        await writer.close()
+
+    asyncio.run(write())
+
+
+def test_writer_flushes_buffers_older_than_flush_seconds(tmp_path, monkeypatch):
+    path = tmp_path / "2024-03-01.json"
+    clock = [1000.0]
+    monkeypatch.setattr(scrape_telegram.time, "monotonic", lambda: clock[0])
+
+    async def write():
+        writer = JsonlWriter(flush_bytes=1 << 20, flush_seconds=5)
+        await writer.write(path, {"message_id": 1})
+        assert _lines(path) == []
+        clock[0] += 5
+        await writer.write(path, {"message_id": 2})
+        assert [line["message_id"] for line in _lines(path)] == [1, 2]
+        await writer.close()
+
+    asyncio.run(write())
+
+
+def test_writer_appends_to_one_file_per_day(tmp_path):
+    first, second = tmp_path / "2024-03-01.json", tmp_path / "2024-03-02.json"
+    first.write_text(json.dumps({"message_id": 0}) + "\n")
+
+    async def write():
+        writer = JsonlWriter()
+        await writer.write(first, {"message_id": 1})
+        await writer.write(second, {"message_id": 2})
+        await writer.close()
+
+    asyncio.run(write())
+    assert [line["message_id"] for line in _lines(first)] == [0, 1]
+    assert [line["message_id"] for line in _lines(second)] == [2]
+
+
+def test_writer_close_flushes_after_an_error(tmp_path):
+    path = tmp_path / "2024-03-01.json"
+
+    async def write():
+        writer = JsonlWriter(flush_bytes=1 << 20, flush_seconds=3600)
+        try:
+            await writer.write(path, {"message_id": 1})
+            raise RuntimeError("scrape failed")
+        finally:
+            await writer.close()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(write())
+    assert _lines(path) == [{"message_id": 1}]
+
+
+def test_scrape_flushes_messages_when_the_channel_fails(tmp_path, lake):
+    client = FakeClient(3)
+
+    async def iter_messages(entity, **kwargs):
+        yield client.messages[0]
+        raise RuntimeError("connection lost")
+
+    client.iter_messages = iter_messages
+    results = _scrape(client, None, 0, 100, backfill=False)
+    assert not results[0]["completed"]
+    assert _lines(lake / "pharma" / "2024-03-01.json") == [
+        {"message_id": 3, "date": "2024-03-01T03:00:00+00:00", "text": "message 3",
+         "has_media": False, "media_type": None, "media_path": None}]